@@ -0,0 +1,73 @@
+import io
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+from xmonkey_namonica.common import PackageManager
+from xmonkey_namonica.utils import mapped_file
+
+
+def build_files(root, count, lines):
+    paths = []
+    for num in range(count):
+        path = os.path.join(root, f"file{num}.js")
+        with open(path, "wb") as f:
+            f.write(f"// Copyright (c) 2021 Author {num} Inc\n".encode())
+            for line in range(lines):
+                f.write(f"var line{line} = 'generated content';\n".encode())
+            # A stray Latin-1 byte, as in many vendored sources
+            f.write("// Ported by Müller\n".encode("latin-1"))
+            f.write(b"// Copyright 2022 Second Holder\n")
+        paths.append(path)
+    return paths
+
+
+def decode_lines(path):
+    # The previous approach: decode the whole file as UTF-8 and check
+    # every line, giving up at the first undecodable one
+    hits = []
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError as e:
+        text = data[:data.rfind(b"\n", 0, e.start) + 1].decode("utf-8")
+    for line in io.StringIO(text, newline=None):
+        if "copyright " in line.strip().lower():
+            hits.append(line)
+    return hits
+
+
+def prefiltered(path):
+    with mapped_file(path) as data:
+        return list(PackageManager.copyright_candidates(data))
+
+
+def run(paths, scan):
+    start = time.perf_counter()
+    hits = sum(len(scan(path)) for path in paths)
+    return time.perf_counter() - start, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare line-by-line and prefiltered copyright scans"
+    )
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=20000)
+    args = parser.parse_args()
+    root = tempfile.mkdtemp()
+    try:
+        paths = build_files(root, args.files, args.lines)
+        for name, scan in (("decode all lines", decode_lines),
+                           ("byte prefilter", prefiltered)):
+            elapsed, hits = run(paths, scan)
+            print(f"{name:<18} time={elapsed:6.2f}s candidate lines={hits}")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
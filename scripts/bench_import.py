@@ -0,0 +1,53 @@
+import sys
+import argparse
+import subprocess
+
+# Modules that should not be loaded just to start the CLI
+HEAVY_MODULES = ("bs4", "magic", "xmonkey_lidy", "pkg_resources", "tqdm")
+
+
+def import_times(module):
+    """Return {module: cumulative microseconds} from python -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check the CLI import time against a budget"
+    )
+    parser.add_argument("--module", default="xmonkey_namonica.cli")
+    parser.add_argument(
+        "--budget-ms", type=float, default=50,
+        help="Largest acceptable cumulative import time"
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    # Take the best run to filter out noise from a busy machine
+    best = None
+    for _ in range(args.runs):
+        times = import_times(args.module)
+        if best is None or times[args.module] < best[args.module]:
+            best = times
+    total_ms = best[args.module] / 1000
+    print(f"{args.module}: {total_ms:.1f} ms (budget {args.budget_ms} ms)")
+    heavy = sorted(
+        name for name in best if name.split(".")[0] in HEAVY_MODULES
+    )
+    if heavy:
+        print("heavy modules imported: " + ", ".join(heavy))
+    return 0 if total_ms <= args.budget_ms and not heavy else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
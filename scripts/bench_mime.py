@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import gzip
+import magic
+import shutil
+import tempfile
+import argparse
+from xmonkey_namonica.utils import detect_mime, get_mime_detector
+
+SAMPLES = {
+    "source.py": b"# Copyright (c) 2020 Foo Inc\nimport os\n" * 40,
+    "README.md": "Café docs © 2021 Bar Corp\n".encode() * 40,
+    "latin1.txt": "Copyright © 2019 Müller\n".encode("latin-1") * 40,
+    "image.png": b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 8,
+    "lib.so": b"\x7fELF\x02\x01\x01" + bytes(2048),
+    "data.bin": bytes(range(256)) * 8,
+    "nested.tar.gz": gzip.compress(b"payload" * 100),
+}
+
+
+def build_files(root, count):
+    paths = []
+    names = sorted(SAMPLES)
+    for i in range(count):
+        name = names[i % len(names)]
+        path = os.path.join(root, f"{i}-{name}")
+        with open(path, "wb") as f:
+            f.write(SAMPLES[name])
+        paths.append(path)
+    return paths
+
+
+def new_magic_per_file(path):
+    return magic.Magic(mime=True).from_file(path)
+
+
+def cached_detector(path):
+    return get_mime_detector().from_file(path)
+
+
+def run(paths, detect):
+    start = time.perf_counter()
+    for path in paths:
+        detect(path)
+    return len(paths) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure MIME classification throughput in files/s"
+    )
+    parser.add_argument("--files", type=int, default=2000)
+    args = parser.parse_args()
+    root = tempfile.mkdtemp()
+    try:
+        paths = build_files(root, args.files)
+        for name, detect in (("new Magic per file", new_magic_per_file),
+                             ("cached detector", cached_detector),
+                             ("sniff + cached", detect_mime)):
+            print(f"{name:<20} {run(paths, detect):10.0f} files/s")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+from xmonkey_namonica import cache, common
+from xmonkey_namonica.common import PackageManager
+
+PATTERNS = ['COPYRIGHT', 'NOTICES', 'LICENSE', 'COPYING']
+LICENSE_TEXT = """Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+"""
+
+
+def build_tree(root, packages, files_per_package, lines_per_file):
+    for pkg in range(packages):
+        pkg_dir = os.path.join(root, f"pkg{pkg}", "src")
+        os.makedirs(pkg_dir)
+        with open(os.path.join(root, f"pkg{pkg}", "LICENSE"), "w") as f:
+            f.write("MIT License\n\n")
+            f.write(f"Copyright (c) 20{pkg % 100:02d} Vendor {pkg}\n\n")
+            f.write(LICENSE_TEXT)
+        for num in range(files_per_package):
+            with open(os.path.join(pkg_dir, f"file{num}.txt"), "w") as f:
+                f.write(f"Copyright (c) 2021 Author {num} Inc\n")
+                for line in range(lines_per_file):
+                    f.write(f"line {line} of generated content\n")
+
+
+def reset_caches():
+    # Every configuration must scan for real: no on-disk license results
+    # (which would also land in the user's cache) or memoized copyrights
+    # from an earlier run
+    cache.configure(enabled=False)
+    common._copyright_memo.clear()
+
+
+def run(root, workers):
+    reset_caches()
+    PackageManager.set_scan_workers(workers)
+    # Warm up the pool so process start-up isn't part of the timing
+    if workers > 1:
+        PackageManager.get_scan_pool().submit(int).result()
+    start = time.perf_counter()
+    files = PackageManager.scan_for_files(root, PATTERNS)
+    copyrights = PackageManager.scan_for_copyright(root)
+    elapsed = time.perf_counter() - start
+    return elapsed, len(files), len(copyrights)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark scan scaling over a synthetic tree"
+    )
+    parser.add_argument("--packages", type=int, default=50)
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--lines", type=int, default=200)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    root = tempfile.mkdtemp()
+    try:
+        build_tree(root, args.packages, args.files, args.lines)
+        baseline = None
+        workers = 1
+        while workers <= args.max_workers:
+            elapsed, files, copyrights = run(root, workers)
+            baseline = baseline or elapsed
+            print(
+                f"workers={workers:<3} time={elapsed:7.2f}s "
+                f"speedup={baseline / elapsed:5.2f}x "
+                f"license_files={files} copyrights={copyrights}"
+            )
+            workers *= 2
+    finally:
+        PackageManager.set_scan_workers(1)
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import magic
+import shutil
+import builtins
+import tempfile
+import argparse
+from collections import Counter
+from bench_scan import build_tree, reset_caches, PATTERNS
+from xmonkey_namonica.common import PackageManager
+
+counts = Counter()
+
+
+def counted(name, func):
+    def wrapper(*args, **kwargs):
+        counts[name] += 1
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def instrument():
+    # Count the file-system work each strategy does: opens, directory
+    # listings and libmagic classifications
+    builtins.open = counted("open", builtins.open)
+    os.scandir = counted("scandir", os.scandir)
+    magic.Magic.from_file = counted("magic", magic.Magic.from_file)
+
+
+def two_walks(root):
+    PackageManager.scan_for_files(root, PATTERNS)
+    PackageManager.scan_for_copyright(root)
+
+
+def single_pass(root):
+    PackageManager.scan_tree(root, PATTERNS)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare two-walk and single-pass tree scanning"
+    )
+    # Few license files and many sources, so license identification
+    # doesn't drown out the walk and I/O costs being compared
+    parser.add_argument("--packages", type=int, default=2)
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--lines", type=int, default=200)
+    args = parser.parse_args()
+    root = tempfile.mkdtemp()
+    try:
+        build_tree(root, args.packages, args.files, args.lines)
+        instrument()
+        for name, scan in (("two walks", two_walks),
+                           ("single pass", single_pass)):
+            reset_caches()
+            counts.clear()
+            start = time.perf_counter()
+            scan(root)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{name:<12} time={elapsed:6.2f}s open={counts['open']} "
+                f"scandir={counts['scandir']} magic={counts['magic']}"
+            )
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,7 +2,7 @@ import requests
 
 def fetch_gem_details(package_name, version):
     api_url = f"https://rubygems.org/api/v1/gems/{package_name}.json"
-    response = requests.get(api_url)
+    response = requests.get(api_url, timeout=30)
     if response.status_code == 200:
         data = response.json()
         # Extract other details
@@ -13,7 +13,7 @@ def get_license_from_npm(package_name, version=None):
         url = f"https://registry.npmjs.org/{package_name}"
     
     # Send a GET request to the NPM registry API
-    response = requests.get(url)
+    response = requests.get(url, timeout=30)
     
     # Check if the request was successful
     if response.status_code == 200:
@@ -9,7 +9,7 @@ def search_nuget_packages(query):
     url = f"https://www.nuget.org/api/v2/Search()?searchTerm='{encoded_query}'&$format=atom"
 
     # Make the GET request
-    response = requests.get(url)
+    response = requests.get(url, timeout=30)
     if response.status_code == 200:
         return response.text
     else:
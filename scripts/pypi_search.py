@@ -6,7 +6,7 @@ def search_pypi(query):
     url = "https://pypi.org/search/?q=" + requests.utils.quote(query)
 
     # Make the GET request
-    response = requests.get(url)
+    response = requests.get(url, timeout=30)
     if response.status_code != 200:
         return f"Failed to fetch data: {response.status_code}"
 
@@ -13,7 +13,7 @@ def download_spdx_licenses(output_file='spdx_licenses.json'):
     print("Downloading SPDX license data...")
     licenses = []
 
-    response = requests.get(SPDX_LICENSES_INDEX_URL)
+    response = requests.get(SPDX_LICENSES_INDEX_URL, timeout=30)
     if response.status_code != 200:
         raise Exception(f"Failed to fetch the SPDX index. Status code: {response.status_code}")
 
@@ -25,7 +25,7 @@ def download_spdx_licenses(output_file='spdx_licenses.json'):
         license_name = license_info['name']
         details_url = license_info['detailsUrl']
 
-        license_response = requests.get(details_url)
+        license_response = requests.get(details_url, timeout=30)
         if license_response.status_code != 200:
             print(f"Failed to fetch license data for {license_id}. Skipping...")
             continue
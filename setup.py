@@ -18,7 +18,7 @@ setup(
             'xmonkey-namonica = xmonkey_namonica.cli:main'
         ]
     },
-    python_requires='>=3.6',
+    python_requires='>=3.8',
     packages=find_packages(),
     include_package_data=True,
     package_data={},
@@ -33,7 +33,6 @@ setup(
         "python-magic",
         "beautifulsoup4",
         "tqdm",
-        'xmonkey-lidy',
-        'setuptools'
+        'xmonkey-lidy'
     ],
 )
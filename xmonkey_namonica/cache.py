@@ -0,0 +1,493 @@
+import os
+import re
+import glob
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+
+# A sha256 digest, or a prefix of one long enough to look a blob up by
+SHA256_PREFIX = re.compile(r"[0-9a-f]{8,64}")
+
+_caches = {}
+_caches_lock = threading.Lock()
+_settings = {
+    "enabled": True,
+    "directory": None,
+    "metadata_ttl": 86400,
+    "metadata_max_bytes": 256 * 1024 * 1024,
+    "artifact_max_bytes": 4 * 1024 * 1024 * 1024,
+    "license_max_bytes": 64 * 1024 * 1024,
+}
+
+
+def default_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "xmonkey-namonica")
+
+
+def configure(**settings):
+    """Update cache settings; instances are rebuilt on next use.
+
+    Accepts enabled, directory, metadata_ttl, metadata_max_bytes,
+    artifact_max_bytes and license_max_bytes.
+    """
+    with _caches_lock:
+        for key, value in settings.items():
+            if key not in _settings:
+                raise ValueError(f"Unknown cache setting {key}")
+            _settings[key] = value
+        _caches.clear()
+
+
+def get_settings():
+    """Return a copy of the current settings, as accepted by configure."""
+    with _caches_lock:
+        return dict(_settings)
+
+
+def _get_cache(name, factory):
+    with _caches_lock:
+        if not _settings["enabled"]:
+            return None
+        if name not in _caches:
+            directory = os.path.join(
+                _settings["directory"] or default_cache_dir(), name
+            )
+            try:
+                _caches[name] = factory(directory)
+            except OSError as e:
+                logging.error(f"Cache {directory} unavailable: {e}")
+                _caches[name] = None
+        return _caches[name]
+
+
+def get_metadata_cache():
+    return _get_cache("metadata", lambda directory: MetadataCache(
+        directory,
+        ttl=_settings["metadata_ttl"],
+        max_bytes=_settings["metadata_max_bytes"]
+    ))
+
+
+def get_artifact_cache():
+    return _get_cache("artifacts", lambda directory: ArtifactCache(
+        directory,
+        max_bytes=_settings["artifact_max_bytes"]
+    ))
+
+
+def get_license_cache():
+    return _get_cache("licenses", lambda directory: LicenseCache(
+        directory,
+        version=lidy_version(),
+        max_bytes=_settings["license_max_bytes"]
+    ))
+
+
+def lidy_version():
+    from importlib import metadata
+    try:
+        return metadata.version("xmonkey-lidy")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def is_sha256_prefix(value):
+    """Whether value is a lowercase sha256 digest or a prefix of one."""
+    return bool(value) and SHA256_PREFIX.fullmatch(value) is not None
+
+
+def sha256_file(path):
+    hash_sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hash_sha256.update(chunk)
+    return hash_sha256.hexdigest()
+
+
+def _atomic_write(path, chunks):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class MetadataCache:
+    """Disk cache of registry metadata responses keyed by URL.
+
+    Each entry is a single file holding a JSON header line (URL, ETag,
+    Last-Modified, fetch time) followed by the raw response body. Entries
+    younger than ttl are served as-is; older ones are revalidated with
+    conditional requests. The least recently used entries are evicted once
+    the cache grows beyond max_bytes.
+    """
+
+    def __init__(self, directory, ttl=86400, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url):
+        return os.path.join(
+            self.directory, hashlib.sha256(url.encode()).hexdigest()
+        )
+
+    def get(self, url):
+        path = self._path(url)
+        try:
+            with open(path, "rb") as f:
+                entry = json.loads(f.readline())
+                entry["body"] = f.read()
+        except (OSError, ValueError):
+            return None
+        if entry.get("url") != url:
+            return None
+        try:
+            # Bump mtime so eviction drops the least recently used entries
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def is_fresh(self, entry):
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    def validators(self, entry):
+        """Headers that revalidate entry with a conditional request."""
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url, response):
+        header = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_type": response.headers.get("Content-Type"),
+            "fetched_at": time.time(),
+        }
+        self._write(url, header, response.content)
+
+    def touch(self, entry):
+        """Mark entry as freshly validated after a 304 response."""
+        header = {k: v for k, v in entry.items() if k != "body"}
+        header["fetched_at"] = time.time()
+        self._write(entry["url"], header, entry["body"])
+
+    def _write(self, url, header, body):
+        path = self._path(url)
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        line = json.dumps(header).encode() + b"\n"
+        try:
+            _atomic_write(path, [line, body])
+        except OSError as e:
+            logging.error(f"Failed to cache metadata for {url}: {e}")
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_usage()
+            else:
+                self._size += len(line) + len(body) - old_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        with os.scandir(self.directory) as it:
+            return [entry for entry in it if entry.is_file()]
+
+    def _disk_usage(self):
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda e: e.stat().st_mtime)
+        target = self.max_bytes * 0.9
+        for entry in entries:
+            if self._size <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._size -= size
+            except OSError:
+                continue
+
+
+class ArtifactCache:
+    """Content-addressed store for downloaded package archives.
+
+    Archives live under blobs/ named by their sha256, so identical files
+    reached through different URLs are stored once; urls/ maps the hash
+    of each download URL to the blob it produced. Blobs are copied into
+    the caller's temp directory, and the least recently used ones are
+    evicted once the store grows beyond max_bytes.
+    """
+
+    def __init__(self, directory, max_bytes=4 * 1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+        os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "urls"), exist_ok=True)
+
+    def _blob_path(self, digest):
+        return os.path.join(self.directory, "blobs", digest[:2], digest)
+
+    def _is_blob(self, path):
+        """Whether path is a file inside blobs/, links resolved."""
+        blobs = os.path.realpath(os.path.join(self.directory, "blobs"))
+        path = os.path.realpath(path)
+        return (
+            os.path.commonpath([blobs, path]) == blobs
+            and os.path.isfile(path)
+        )
+
+    def _url_path(self, url):
+        return os.path.join(
+            self.directory, "urls", hashlib.sha256(url.encode()).hexdigest()
+        )
+
+    def lookup(self, url, sha256=None):
+        """Return the blob path for url or a (prefix of a) sha256.
+
+        A sha256 that is not hex digits, or is too short to match a blob
+        by prefix, is ignored and only url is looked up.
+        """
+        blob_path = None
+        sha256 = sha256.lower() if sha256 else None
+        if is_sha256_prefix(sha256):
+            if len(sha256) == 64:
+                candidates = [self._blob_path(sha256)]
+            else:
+                candidates = glob.glob(
+                    glob.escape(self._blob_path(sha256)) + "*"
+                )
+            blob_path = next(
+                (path for path in candidates if self._is_blob(path)), None
+            )
+        if blob_path is None and url:
+            try:
+                with open(self._url_path(url)) as f:
+                    digest = f.read().strip()
+            except OSError:
+                digest = None
+            if (
+                is_sha256_prefix(digest) and len(digest) == 64
+                and self._is_blob(self._blob_path(digest))
+            ):
+                blob_path = self._blob_path(digest)
+        if blob_path is not None:
+            try:
+                os.utime(blob_path)
+            except OSError:
+                pass
+        return blob_path
+
+    def fetch(self, url, dest, sha256=None):
+        """Copy the cached archive for url to dest and return its sha256.
+
+        Returns None on a miss. A blob whose content no longer matches
+        its digest is removed and treated as a miss.
+        """
+        blob_path = self.lookup(url, sha256)
+        if blob_path is None or not self._is_blob(blob_path):
+            return None
+        digest = os.path.basename(blob_path)
+        try:
+            copied = _copy_file(blob_path, dest)
+        except OSError as e:
+            logging.error(f"Failed to read cached {blob_path}: {e}")
+            return None
+        if copied != digest:
+            logging.error(f"Removing corrupted cached artifact {blob_path}")
+            for path in (blob_path, dest):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            return None
+        logging.info(f"Using cached artifact for {url}")
+        return digest
+
+    def store(self, url, path, digest=None):
+        """Add the archive downloaded from url at path to the store."""
+        digest = digest or sha256_file(path)
+        blob_path = self._blob_path(digest)
+        added = 0
+        try:
+            if not os.path.isfile(blob_path):
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(
+                    dir=os.path.dirname(blob_path)
+                )
+                os.close(fd)
+                os.remove(tmp_path)
+                _copy_file(path, tmp_path)
+                os.replace(tmp_path, blob_path)
+                added = os.path.getsize(blob_path)
+            if url:
+                _atomic_write(self._url_path(url), [digest.encode()])
+        except OSError as e:
+            logging.error(f"Failed to cache artifact from {url}: {e}")
+            return digest
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_usage()
+            else:
+                self._size += added
+            if self._size > self.max_bytes:
+                self._evict()
+        return digest
+
+    def _blobs(self):
+        blobs = []
+        for root, dirs, files in os.walk(os.path.join(self.directory, "blobs")):
+            for file in files:
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                blobs.append((stat.st_mtime, stat.st_size, path))
+        return blobs
+
+    def _disk_usage(self):
+        return sum(size for _, size, _ in self._blobs())
+
+    def _evict(self):
+        # URL entries pointing at evicted blobs are left dangling and
+        # simply miss on lookup
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(self._blobs()):
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+                self._size -= size
+            except OSError:
+                continue
+
+
+class LicenseCache:
+    """Disk cache of license identification results keyed by text.
+
+    Keys are the sha256 of the license text after normalizations that
+    cannot change the matcher's answer (newline style, case and outer
+    whitespace), so the same text found in many packages is identified
+    once. Entries live under a directory named after the installed
+    xmonkey-lidy version; directories of other versions are dropped, as
+    their results may be stale. Lookups are also memoized in memory.
+    """
+
+    def __init__(self, directory, version, max_bytes=64 * 1024 * 1024):
+        self.directory = os.path.join(directory, version)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._memory = {}
+        self._size = None
+        os.makedirs(self.directory, exist_ok=True)
+        for entry in os.scandir(directory):
+            if entry.is_dir() and entry.name != version:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    @staticmethod
+    def key(text):
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return hashlib.sha256(text.strip().lower().encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, text):
+        key = self.key(text)
+        with self._lock:
+            if key in self._memory:
+                return dict(self._memory[key])
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            # Bump mtime so eviction drops the least recently used entries
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self._memory[key] = result
+        return dict(result)
+
+    def put(self, text, result):
+        key = self.key(text)
+        with self._lock:
+            self._memory[key] = dict(result)
+        try:
+            body = json.dumps(result).encode()
+            _atomic_write(self._path(key), [body])
+        except (OSError, TypeError) as e:
+            logging.error(f"Failed to cache license result: {e}")
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_usage()
+            else:
+                self._size += len(body)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        with os.scandir(self.directory) as it:
+            return [entry for entry in it if entry.is_file()]
+
+    def _disk_usage(self):
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda e: e.stat().st_mtime)
+        target = self.max_bytes * 0.9
+        for entry in entries:
+            if self._size <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._size -= size
+            except OSError:
+                continue
+
+
+def _copy_file(src, dest):
+    """Copy src to dest and return the sha256 of the copied bytes.
+
+    Blobs are always copied, never linked: handlers may rewrite their
+    downloads in place (e.g. extract_bz2), which would corrupt a shared
+    inode.
+    """
+    hash_sha256 = hashlib.sha256()
+    with open(src, "rb") as fsrc, open(dest, "wb") as fdest:
+        for chunk in iter(lambda: fsrc.read(1024 * 1024), b""):
+            hash_sha256.update(chunk)
+            fdest.write(chunk)
+    return hash_sha256.hexdigest()
@@ -0,0 +1,51 @@
+import json
+import logging
+import threading
+
+
+class Checkpoint:
+    """Append-only record of the PURLs a batch has finished.
+
+    Each line is a JSON object with the PURL, its status and, for
+    completed PURLs, the result. Lines are flushed as they are written,
+    so after a crash at most the PURL in flight is lost; a torn last
+    line is ignored on load. Later lines for a PURL override earlier
+    ones.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self._lock = threading.Lock()
+        self.completed = self._load() if resume else {}
+        self._file = open(path, "a" if resume else "w")
+
+    def _load(self):
+        completed = {}
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get("status") == "ok":
+                        completed[entry["purl"]] = entry["result"]
+                    else:
+                        completed.pop(entry.get("purl"), None)
+        except FileNotFoundError:
+            pass
+        logging.info(f"Resuming with {len(completed)} completed PURLs")
+        return completed
+
+    def record(self, purl, status, result=None, error=None):
+        entry = {"purl": purl, "status": status}
+        if result is not None:
+            entry["result"] = result
+        if error is not None:
+            entry["error"] = error
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
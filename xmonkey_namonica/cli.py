@@ -1,42 +1,136 @@
+import os
+import sys
 import json
+import time
+import logging
 import argparse
-from tqdm import tqdm
-from .handlers.gem_handler import GemHandler
-from .handlers.npm_handler import NpmHandler
-from .handlers.pypi_handler import PypiHandler
-from .handlers.cargo_handler import CargoHandler
-from .handlers.nuget_handler import NugetHandler
-from .handlers.gen_handler import GenericHandler
-from .handlers.conda_handler import CondaHandler
-from .handlers.github_handler import GithubHandler
-from .handlers.golang_handler import GolangHandler
-
-
-def process_purl(purl):
-    if "pkg:npm" in purl:
-        handler = NpmHandler(purl)
-    elif "pkg:cargo" in purl:
-        handler = CargoHandler(purl)
-    elif "pkg:pypi" in purl:
-        handler = PypiHandler(purl)
-    elif "pkg:nuget" in purl:
-        handler = NugetHandler(purl)
-    elif "pkg:golang" in purl:
-        handler = GolangHandler(purl)
-    elif "pkg:gem" in purl:
-        handler = GemHandler(purl)
-    elif "pkg:conda" in purl:
-        handler = CondaHandler(purl)
-    elif "pkg:generic" in purl:
-        handler = GenericHandler(purl)
-    elif "pkg:github" in purl:
-        handler = GithubHandler(purl)
-    else:
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from . import stats
+from . import deadline
+from .pipeline import Pipeline
+from .checkpoint import Checkpoint
+from .errors import error_result
+from .handlers import load_handler
+
+# PURLs submitted per --jobs worker ahead of the next result to yield,
+# so workers stay busy while a slow PURL holds up in-order output
+WINDOW_PER_JOB = 4
+
+
+def get_handler(purl, purl_details=None):
+    from .common import PackageManager
+    if purl_details is None:
+        purl_details = PackageManager.parse_purl(purl)
+    try:
+        handler_class = load_handler(purl_details['type'])
+    except ValueError:
         raise ValueError(f"Unsupported PURL type {purl}")
+    return handler_class(purl, purl_details)
+
+
+def process_purl(purl, handler_factory=get_handler):
+    handler = handler_factory(purl)
     handler.fetch()
     return handler.generate_report()
 
 
+def run_purl(purl, timeout=None, started=None, handler_factory=get_handler):
+    """Process one PURL, turning any failure into an error report.
+
+    Processing stops with a timeout report once it has taken more than
+    timeout seconds. When given, started[purl] gets the time processing
+    started.
+    """
+    if started is not None:
+        started[purl].append(time.monotonic())
+    try:
+        with deadline.budget(deadline.start(timeout)):
+            return process_purl(purl, handler_factory)
+    except Exception as e:
+        logging.error(f"Failed to process {purl}: {e}")
+        return error_result(purl, e)
+
+
+def process_purls(
+    purls, jobs=1, progress=None, pipeline=None, timeout=None, started=None,
+    handler_factory=get_handler
+):
+    """Yield a report per PURL, in input order, using up to jobs workers.
+
+    Failed PURLs yield an error report (see errors.error_result), and
+    PURLs taking more than timeout seconds a timeout report. When given,
+    started maps each PURL to a deque that gets the time.monotonic() its
+    processing started.
+    """
+    if pipeline is not None:
+        yield from pipeline.run(purls, progress, started)
+        return
+    if jobs <= 1:
+        for purl in purls:
+            result = run_purl(purl, timeout, started, handler_factory)
+            if progress is not None:
+                progress.update(1)
+            yield result
+        return
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        # Only a window of PURLs is in flight, and each result is dropped
+        # once yielded, so memory stays bounded however long the batch
+        window = deque()
+        try:
+            for purl in purls:
+                future = executor.submit(
+                    run_purl, purl, timeout, started, handler_factory
+                )
+                if progress is not None:
+                    future.add_done_callback(lambda f: progress.update(1))
+                window.append(future)
+                if len(window) >= jobs * WINDOW_PER_JOB:
+                    yield window.popleft().result()
+            while window:
+                yield window.popleft().result()
+        finally:
+            for future in window:
+                future.cancel()
+
+
+def ospi_line(result):
+    purl = result['purl']
+    license = result['license'] or 'NOASSERTION'
+    copyrights = list(
+        set([entry['line'] for entry in result['copyrights']])
+    )
+    copyrights = ",".join(copyrights) or 'NOASSERTION'
+    down_url = result['url'] or 'NOASSERTION'
+    return f'"{purl}","{license}","{copyrights}","{down_url}"'
+
+
+def is_transient_result(result):
+    return bool(result.get('error', {}).get('transient'))
+
+
+def write_line(line, export_file=None):
+    """Write one streamed result and flush it so readers see it at once."""
+    print(line, flush=True)
+    if export_file is not None:
+        export_file.write(line + "\n")
+        export_file.flush()
+
+
+def rate_limit(value):
+    """Parse a HOST=RATE --rate-limit value; a RATE of 0 means no limit."""
+    host, sep, rate = value.partition("=")
+    try:
+        rate = float(rate)
+    except ValueError:
+        sep = None
+    if not host or not sep or rate < 0:
+        raise argparse.ArgumentTypeError(
+            f"expected HOST=REQUESTS_PER_SECOND, got {value!r}"
+        )
+    return host, rate or None
+
+
 def main():
     parser = argparse.ArgumentParser(description="Package Analyzer Tool")
     parser.add_argument(
@@ -55,12 +149,206 @@ def main():
         action="store_true",
         help="Print a full list of copyrights and license files"
     )
-    parser.add_argument(
+    output_format = parser.add_mutually_exclusive_group()
+    output_format.add_argument(
         "--ospi",
         action="store_true",
         help="Print a list of PURLs and Licenses"
     )
+    output_format.add_argument(
+        "--jsonl",
+        action="store_true",
+        help="Print each result as a JSON line as soon as it is ready"
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=str,
+        help="File recording finished PURLs and their results",
+        default=None
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip PURLs already completed in the --checkpoint file"
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        help="Rounds of retries for PURLs that failed with network errors",
+        default=2
+    )
+    parser.add_argument(
+        "--retry-backoff",
+        type=float,
+        help="Seconds before the first retry round, doubled every round",
+        default=2.0
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        help="Number of PURLs to process concurrently",
+        default=1
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Run downloads, unpacking and scanning as separate stages"
+    )
+    parser.add_argument(
+        "--download-jobs",
+        type=int,
+        help="Concurrent downloads in pipeline mode",
+        default=4
+    )
+    parser.add_argument(
+        "--unpack-jobs",
+        type=int,
+        help="Concurrent extractions in pipeline mode",
+        default=2
+    )
+    parser.add_argument(
+        "--scan-jobs",
+        type=int,
+        help="Concurrent scans in pipeline mode (default: CPU count)",
+        default=None
+    )
+    parser.add_argument(
+        "--scan-processes",
+        type=int,
+        help="Processes used to scan the files of each package",
+        default=1
+    )
+    parser.add_argument(
+        "--scan-archives",
+        action="store_true",
+        help="Scan npm, cargo, pypi, nuget and golang archives in place"
+    )
+    parser.add_argument(
+        "--selective-extract",
+        action="store_true",
+        help="Only extract license files and small text-like files"
+    )
+    parser.add_argument(
+        "--member-size-cap",
+        type=int,
+        help="Largest non-license file in KB kept by --selective-extract",
+        default=1024
+    )
+    parser.add_argument(
+        "--copyright-header",
+        type=int,
+        help="Only search the first N KB of non-license files for copyrights",
+        default=None
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        help="Seconds a single PURL may take before it is reported as "
+             "TIMEOUT, or 0 for no limit",
+        default=900
+    )
+    parser.add_argument(
+        "--connect-timeout",
+        type=float,
+        help="Seconds to wait for a connection to a server",
+        default=10
+    )
+    parser.add_argument(
+        "--read-timeout",
+        type=float,
+        help="Seconds to wait for data from a server",
+        default=60
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=rate_limit,
+        action="append",
+        default=[],
+        metavar="HOST=RATE",
+        help="Requests per second allowed to HOST, or 0 for no limit; "
+             "may be repeated"
+    )
+    parser.add_argument(
+        "--http-retries",
+        type=int,
+        help="Retries of requests answered with 429 or 5xx",
+        default=3
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print run statistics to stderr when done"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        help="Directory for cached metadata, archives and license results",
+        default=None
+    )
+    parser.add_argument(
+        "--metadata-ttl",
+        type=int,
+        help="Seconds before cached metadata is revalidated",
+        default=86400
+    )
+    parser.add_argument(
+        "--artifact-cache-size",
+        type=int,
+        help="Size limit in MB for cached package archives",
+        default=4096
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write the on-disk cache"
+    )
+    parser.add_argument(
+        "--max-download-size",
+        type=int,
+        help="Abort downloads larger than this many MB",
+        default=None
+    )
     args = parser.parse_args()
+    if args.resume and not args.checkpoint:
+        parser.error("--resume requires --checkpoint")
+    # Imported after parsing so --help and bad arguments stay fast
+    from tqdm import tqdm
+    from .common import PackageManager
+    from .utils import set_max_download_size
+    from .utils import ExtractPolicy, set_extract_policy
+    from . import cache
+    from . import http_client
+    from .planning import MetadataPlan
+    PackageManager.set_scan_workers(args.scan_processes)
+    PackageManager.scan_archives = args.scan_archives
+    if args.copyright_header is not None:
+        PackageManager.copyright_header_bytes = args.copyright_header * 1024
+    if args.selective_extract:
+        set_extract_policy(
+            ExtractPolicy(max_size=args.member_size_cap * 1024)
+        )
+    if args.max_download_size:
+        set_max_download_size(args.max_download_size * 1024 * 1024)
+    http_client.set_timeouts(args.connect_timeout, args.read_timeout)
+    http_client.set_retries(args.http_retries)
+    for host, rate in args.rate_limit:
+        http_client.set_rate_limit(host, rate)
+    cache.configure(
+        enabled=not args.no_cache,
+        directory=args.cache_dir,
+        metadata_ttl=args.metadata_ttl,
+        artifact_max_bytes=args.artifact_cache_size * 1024 * 1024
+    )
+    # Every concurrent worker may hold a keep-alive connection per host
+    if args.pipeline:
+        http_client.configure(
+            args.download_jobs + (args.scan_jobs or os.cpu_count() or 1)
+        )
+    else:
+        http_client.configure(args.jobs)
+    # Fork scan workers, configured as above, while this is still the
+    # only thread
+    PackageManager.start_scan_pool()
     try:
         # Check if input is a file
         if args.input.endswith(".txt"):
@@ -68,34 +356,122 @@ def main():
                 purls = file.readlines()
         else:
             purls = [args.input]
+        purls = [purl.strip() for purl in purls if purl.strip()]
 
-        results = []
+        if args.ospi or args.jsonl:
+            args.full = None
+        # OSPI and JSON Lines are written as each result arrives, the
+        # other formats need the whole batch
+        stream = args.ospi or args.jsonl
+        export_file = None
+        if stream and args.export:
+            export_file = open(args.export, "w")
+        checkpoint = None
+        completed = {}
+        if args.checkpoint:
+            checkpoint = Checkpoint(args.checkpoint, resume=args.resume)
+            completed = checkpoint.completed
+        pending = [purl for purl in purls if purl not in completed]
+        # Versions of one package fetch its registry metadata only once
+        plan = MetadataPlan(pending)
+
+        def make_handler(purl):
+            # Reuse the details the plan parsed instead of parsing again
+            return get_handler(purl, plan.details.get(purl))
+
+        pipeline = None
+        if args.pipeline:
+            pipeline = Pipeline(
+                make_handler,
+                download_workers=args.download_jobs,
+                unpack_workers=args.unpack_jobs,
+                scan_workers=args.scan_jobs,
+                timeout=args.timeout
+            )
+        results = [None] * len(purls)
         fnd_licenses = []
-        for purl in tqdm(purls, desc="Processing PURLs", unit="purl"):
-            purl = purl.strip()
-            if purl:
-                result = process_purl(purl)
+        # When each pending PURL's first attempt started, so its time is
+        # measured across retry rounds up to its final result
+        started = {purl: deque() for purl in pending}
+
+        def emit(index, purl, result):
+            if purl not in completed:
+                plan.done(purl)
+                if started[purl]:
+                    stats.observe(
+                        "purl_seconds",
+                        time.monotonic() - started[purl].popleft()
+                    )
                 result['purl'] = purl
-                results.append(result)
-        if args.ospi:
-            args.full = None
+                if checkpoint is not None:
+                    if 'error' in result:
+                        checkpoint.record(purl, "error", error=result['error'])
+                    else:
+                        checkpoint.record(purl, "ok", result)
+            if stream:
+                line = (
+                    json.dumps(result) if args.jsonl
+                    else ospi_line(result)
+                )
+                write_line(line, export_file)
+            else:
+                results[index] = result
+
+        # PURLs that failed with a transient error, retried at the end
+        retries = []
+        fresh = None
+        try:
+            with tqdm(
+                total=len(purls), desc="Processing PURLs", unit="purl"
+            ) as progress:
+                progress.update(len(purls) - len(pending))
+                fresh = process_purls(
+                    pending, args.jobs, progress, pipeline, args.timeout,
+                    started, make_handler
+                )
+                for index, purl in enumerate(purls):
+                    if purl in completed:
+                        result = completed[purl]
+                    else:
+                        result = next(fresh)
+                        if args.retries and is_transient_result(result):
+                            retries.append((index, purl))
+                            continue
+                    emit(index, purl, result)
+            for attempt in range(1, args.retries + 1):
+                if not retries:
+                    break
+                delay = args.retry_backoff * 2 ** (attempt - 1)
+                logging.info(
+                    f"Retrying {len(retries)} PURLs in {delay:.1f}s"
+                )
+                time.sleep(delay)
+                batch, retries = retries, []
+                for (index, purl), result in zip(batch, process_purls(
+                    [purl for _, purl in batch],
+                    args.jobs, None, pipeline, args.timeout,
+                    handler_factory=make_handler
+                )):
+                    if attempt < args.retries and is_transient_result(result):
+                        retries.append((index, purl))
+                    else:
+                        emit(index, purl, result)
+        finally:
+            if fresh is not None:
+                fresh.close()
+            if export_file is not None:
+                export_file.close()
+            if checkpoint is not None:
+                checkpoint.close()
+        results = [result for result in results if result is not None]
         if args.full:
             print(json.dumps(results, indent=4))
-        elif args.ospi:
-            for result in results:
-                purl = result['purl']
-                license = result['license'] or 'NOASSERTION'
-                copyrights = list(
-                    set([entry['line'] for entry in result['copyrights']])
-                )
-                copyrights = ",".join(copyrights) or 'NOASSERTION'
-                down_url = result['url'] or 'NOASSERTION'
-                str_line = f'"{purl}","{license}","{copyrights}","{down_url}"'
-                print(str_line)
-        else:
+        elif not stream:
             for result in results:
                 purl = result['purl']
                 print(purl)
+                if 'error' in result:
+                    print(f"Error: {result['error']['message']}")
                 copyrights = list(
                     set([entry['line'] for entry in result['copyrights']])
                 )
@@ -108,22 +484,16 @@ def main():
                 )
                 if licenses:
                     print("\nLicense Content:\n" + "\n".join(licenses))
+                if result['truncated_files']:
+                    print(
+                        "\nTruncated Files:\n" +
+                        "\n".join(result['truncated_files'])
+                    )
 
-        if args.export:
+        if args.export and not stream:
             with open(args.export, "w") as f:
                 if args.full:
                     f.write(json.dumps(results, indent=4))
-                elif args.ospi:
-                    for result in results:
-                        purl = result['purl']
-                        license = result['license'] or 'NOASSERTION'
-                        copyrights = list(
-                            set([entry['line'] for entry in result['copyrights']])
-                        )
-                        copyrights = ",".join(copyrights) or 'NOASSERTION'
-                        down_url = result['url'] or 'NOASSERTION'
-                        str_line = f'"{purl}","{license}","{copyrights}","{down_url}"'
-                        f.write(str_line + "\n")
                 else:
                     for result in results:
                         purl = result['purl']
@@ -134,6 +504,8 @@ def main():
                             )
                         )
                         f.write(purl + "\n")
+                        if 'error' in result:
+                            f.write(f"Error: {result['error']['message']}\n")
                         f.write("\n".join(copyrights) + "\n")
                         licenses = list(
                             set(
@@ -145,9 +517,15 @@ def main():
                             f.write("\nLicense Content:\n")
                             f.write("\n".join(licenses))
                             f.write("\n")
+                        if result['truncated_files']:
+                            f.write("\nTruncated Files:\n")
+                            f.write("\n".join(result['truncated_files']))
+                            f.write("\n")
 
     except Exception as e:
-        print(f"Error: {str(e)}")
+        print(f"Error: {str(e)}", file=sys.stderr)
+    if args.stats:
+        print(stats.report(), file=sys.stderr)
 
 
 if __name__ == "__main__":
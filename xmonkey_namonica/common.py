@@ -1,18 +1,145 @@
 import os
 import re
 import json
-import magic
-import pickle
+import atexit
 import logging
+import threading
 from typing import List, Dict
-from pkg_resources import resource_filename
-from xmonkey_lidy.matcher import LicenseMatcher
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from urllib.parse import unquote, urlparse, parse_qs
 from urllib.parse import urlparse, parse_qs, unquote
 from .utils import download_file, temp_directory, extract_zip, extract_tar
+from .utils import iter_archive, decode_text, mapped_file
+from .utils import detect_mime, detect_mime_buffer, MIME_HEADER_SIZE
+from . import utils
+from . import stats
+from . import deadline
+from . import cache
+from .cache import get_license_cache
+
+# Byte-level prefilter for copyright lines, see copyright_candidates
+COPYRIGHT_KEYWORD = b'copyright '
+LINE_END = re.compile(rb'[\r\n]')
+_FIND_BLOCK_SIZE = 1024 * 1024
+
+_scan_pool_lock = threading.Lock()
+_matcher_lock = threading.Lock()
+_matcher = None
+
+
+def get_license_matcher():
+    """Return the process-wide LicenseMatcher, loading it on first use.
+
+    The matcher only reads its data after loading, so threads share it.
+    It is loaded before the scan pool starts, letting forked workers
+    inherit it instead of loading their own.
+    """
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                # Imported here as the matcher's dependencies are slow
+                # to load and many runs never reach a scan
+                from xmonkey_lidy.matcher import LicenseMatcher
+                _matcher = LicenseMatcher()
+    return _matcher
+
+
+def _find_lowered(data, keyword):
+    """Yield each offset of lowercase keyword in data, ignoring case.
+
+    data is lowered a block at a time, which is much faster than a
+    case-insensitive regex and keeps memory flat for mapped files.
+    """
+    overlap = len(keyword) - 1
+    for offset in range(0, len(data), _FIND_BLOCK_SIZE):
+        block = data[offset:offset + _FIND_BLOCK_SIZE + overlap].lower()
+        index = block.find(keyword)
+        # Hits starting in the overlap are found again in the next block
+        while index != -1 and index < _FIND_BLOCK_SIZE:
+            yield offset + index
+            index = block.find(keyword, index + 1)
+
+
+def _scan_chunk(kind, items, lmatcher):
+    found_files = []
+    copyrights = []
+    truncated = []
+    for item in items:
+        deadline.check()
+        if kind == 'license':
+            found_files.extend(PackageManager.scan_license_file(item, lmatcher))
+        elif kind == 'copyright':
+            copyrights.extend(PackageManager.scan_copyright_file(item, lmatcher))
+        else:
+            files, copyhits, cut = PackageManager.scan_tree_file(
+                *item, lmatcher
+            )
+            found_files.extend(files)
+            copyrights.extend(copyhits)
+            truncated.extend(cut)
+    return found_files, copyrights, truncated
+
+
+def _init_scan_worker(copyright_header_bytes, cache_settings):
+    # Workers started with spawn or forkserver do not inherit the run's
+    # settings from the parent, so they are passed in explicitly
+    PackageManager.copyright_header_bytes = copyright_header_bytes
+    cache.configure(**cache_settings)
+    get_license_matcher()
+
+
+def _scan_pool_chunk(kind, items):
+    # Workers run one chunk at a time, so their counters can be reset
+    # and handed back to the parent with each result
+    stats.reset()
+    result = _scan_chunk(kind, items, get_license_matcher())
+    return result, stats.snapshot()
+
+
+class _LineMemo:
+    """Bounded LRU memo of copyright extraction results by cleaned line."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def extract(self, clean_line, lmatcher):
+        with self._lock:
+            if clean_line in self._entries:
+                self._entries.move_to_end(clean_line)
+                stats.incr("copyright_memo_hits")
+                return self._entries[clean_line]
+        stats.incr("copyright_memo_misses")
+        copyrs = lmatcher.extract_copyright_info(clean_line, False)
+        with self._lock:
+            self._entries[clean_line] = copyrs
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return copyrs
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Boilerplate notices repeat across the files of a package
+_copyright_memo = _LineMemo(4096)
 
 
 class PackageManager:
+    # Processes used by scan_paths; 1 keeps scanning in-process
+    scan_workers = 1
+    scan_chunk_size = 64
+    _scan_pool = None
+    # Scan single-archive packages in place instead of extracting them
+    scan_archives = False
+    # Bytes at the start of non-license files searched for copyrights by
+    # scan_tree and scan_archive, None to search whole files
+    copyright_header_bytes = None
+
     @staticmethod
     def parse_purl(purl):
         logging.info(f"parse_purl {purl}")
@@ -65,7 +192,7 @@ class PackageManager:
                 result['repository'] = path_parts[1]
                 result['namespace'] = path_parts[1]
             if len(path_parts) <= 2:
-                print('purl:', purl)
+                logging.error(f"Invalid PURL: {purl}")
                 raise ValueError(
                     "Invalid PURL format."
                 )
@@ -95,9 +222,9 @@ class PackageManager:
             elif file_path.endswith('.tar.gz') or file_path.endswith('.tar'):
                 extract_tar(file_path, temp_dir)
             else:
-                print(f"Unsupported file format for {file_path}")
+                logging.error(f"Unsupported file format for {file_path}")
                 raise ValueError("Unsupported file format")
-            print(f"Package unpacked to {temp_dir}")
+            logging.info(f"Package unpacked to {temp_dir}")
             return temp_dir
 
     @staticmethod
@@ -105,8 +232,7 @@ class PackageManager:
         temp_dir: str,
         patterns: List[str]
     ) -> List[Dict[str, str]]:
-        lmatcher = LicenseMatcher()
-        found_files = []
+        file_paths = []
         for root, dirs, files in os.walk(temp_dir):
             # Exclude .git directories
             dirs[:] = [d for d in dirs if d.lower() != '.git']
@@ -115,40 +241,219 @@ class PackageManager:
                     re.search(pattern, file, re.IGNORECASE)
                     for pattern in patterns
                 ):
-                    file_path = os.path.join(root, file)
-                    try:
-                        file_text = PackageManager.read_file_content(file_path)
-                        if file_text:
-                            LiDy_results  = lmatcher.identify_license(
-                                file_text, False, False, False
-                            )
-                            spdx_code = LiDy_results.get('SPDX', 'Unknown')
-                            method = LiDy_results.get('method', 'Unknown')
-                            score = LiDy_results.get('score', 'Unknown')
-                            found_files.append({
-                                "file": file_path,
-                                "content": file_text,
-                                "spdx": spdx_code,
-                                "score": score,
-                                "method": method,
-                            })
-                    except Exception as e:
-                        print(f"Error processing file {file_path}: {e}")
-                        logging.error(
-                            f"Error processing file {file_path}: {e}"
-                        )
-        return found_files
+                    file_paths.append(os.path.join(root, file))
+        return PackageManager.scan_paths('license', file_paths)[0]
+
+    @staticmethod
+    def scan_license_file(file_path, lmatcher):
+        try:
+            file_text = PackageManager.read_file_content(file_path)
+            return PackageManager.scan_license_text(
+                file_path, file_text, lmatcher
+            )
+        except Exception as e:
+            logging.error(
+                f"Error processing file {file_path}: {e}"
+            )
+        return []
+
+    @staticmethod
+    def scan_license_text(file_path, file_text, lmatcher):
+        if file_text:
+            LiDy_results = PackageManager.identify_license(
+                file_text, lmatcher
+            )
+            spdx_code = LiDy_results.get('SPDX', 'Unknown')
+            method = LiDy_results.get('method', 'Unknown')
+            score = LiDy_results.get('score', 'Unknown')
+            return [{
+                "file": file_path,
+                "content": file_text,
+                "spdx": spdx_code,
+                "score": score,
+                "method": method,
+            }]
+        return []
+
+    @staticmethod
+    def identify_license(file_text, lmatcher):
+        """Identify file_text with lmatcher, going through the license cache."""
+        licenses = get_license_cache()
+        if licenses is not None:
+            result = licenses.get(file_text)
+            if result is not None:
+                return result
+        result = lmatcher.identify_license(file_text, False, False, False)
+        if licenses is not None:
+            licenses.put(file_text, result)
+        return result
+
+    @staticmethod
+    def scan_paths(kind, items):
+        """Run a license, copyright or tree scan over items.
+
+        Returns (license_files, copyrights, truncated_files) lists. Items
+        are spread over the process pool when scan_workers > 1 and there
+        are enough of them to be worth it; results keep item order.
+        """
+        workers = PackageManager.scan_workers
+        chunk_size = PackageManager.scan_chunk_size
+        if workers <= 1 or len(items) <= chunk_size:
+            return _scan_chunk(kind, items, get_license_matcher())
+        chunks = [
+            items[i:i + chunk_size]
+            for i in range(0, len(items), chunk_size)
+        ]
+        pool = PackageManager.get_scan_pool()
+        found_files = []
+        copyrights = []
+        truncated = []
+        for (files, copyhits, cut), counts in pool.map(
+            _scan_pool_chunk, [kind] * len(chunks), chunks
+        ):
+            deadline.check()
+            stats.merge(counts)
+            found_files.extend(files)
+            copyrights.extend(copyhits)
+            truncated.extend(cut)
+        return found_files, copyrights, truncated
+
+    @staticmethod
+    def scan_tree(
+        temp_dir: str,
+        patterns: List[str]
+    ):
+        """Find license files and copyrights in a single walk of temp_dir.
+
+        Equivalent to scan_for_files plus scan_for_copyright, but each
+        file is classified and read once and both scans share its bytes.
+        Also returns the files whose copyright scan stopped at
+        copyright_header_bytes.
+        """
+        items = []
+        for root, dirs, files in os.walk(temp_dir):
+            # Exclude .git directories
+            dirs[:] = [d for d in dirs if d.lower() != '.git']
+            for file in files:
+                is_license = any(
+                    re.search(pattern, file, re.IGNORECASE)
+                    for pattern in patterns
+                )
+                items.append((os.path.join(root, file), is_license))
+        return PackageManager.scan_paths('tree', items)
+
+    @staticmethod
+    def scan_tree_file(file_path, is_license, lmatcher):
+        # One open per file: the MIME type is sniffed from the mapping
+        try:
+            with mapped_file(file_path) as data:
+                header = data[:MIME_HEADER_SIZE]
+                if not PackageManager.is_readable_text_buffer(header):
+                    return [], [], []
+                return PackageManager.scan_file_data(
+                    file_path, data, is_license, lmatcher
+                )
+        except FileNotFoundError:
+            return [], [], []
+        except OSError as e:
+            logging.error(f"Error processing file {file_path}: {e}")
+            return [], [], []
+
+    @staticmethod
+    def scan_file_data(file_path, data, is_license, lmatcher):
+        """Scan the bytes of one text file for a license and copyrights.
+
+        Non-license files longer than copyright_header_bytes only have
+        their first lines searched, and are returned as truncated.
+        """
+        found_files = []
+        truncated = []
+        if is_license:
+            file_text = decode_text(bytes(data))
+            if file_text:
+                # Same newline translation as reading in text mode
+                file_text = file_text.replace('\r\n', '\n')
+                file_text = file_text.replace('\r', '\n')
+            try:
+                found_files = PackageManager.scan_license_text(
+                    file_path, file_text, lmatcher
+                )
+            except Exception as e:
+                logging.error(
+                    f"Error processing file {file_path}: {e}"
+                )
+        limit = PackageManager.copyright_header_bytes
+        if not is_license and limit is not None and len(data) > limit:
+            # Stop after the last whole line that fits in the budget
+            cut = max(
+                data.rfind(b'\n', 0, limit), data.rfind(b'\r', 0, limit)
+            ) + 1
+            data = data[:cut or limit]
+            truncated.append(file_path)
+        copyrights = PackageManager.scan_copyright_lines(
+            file_path, PackageManager.copyright_candidates(data), lmatcher
+        )
+        return found_files, copyrights, truncated
+
+    @staticmethod
+    def start_scan_pool():
+        """Create the scan pool and start its workers now.
+
+        Call this once the run is configured, since workers take their
+        settings when they start, and before the process starts other
+        threads: forked workers inherit the preloaded license matcher,
+        and forking a single-threaded process cannot copy a lock another
+        thread holds.
+        """
+        if PackageManager.scan_workers > 1:
+            # The first task launches every worker of a fork-based pool
+            PackageManager.get_scan_pool().submit(int).result()
+
+    @staticmethod
+    def get_scan_pool():
+        """Return the scan pool, creating it if start_scan_pool did not."""
+        with _scan_pool_lock:
+            if PackageManager._scan_pool is None:
+                get_license_matcher()
+                PackageManager._scan_pool = ProcessPoolExecutor(
+                    max_workers=PackageManager.scan_workers,
+                    initializer=_init_scan_worker,
+                    initargs=(
+                        PackageManager.copyright_header_bytes,
+                        cache.get_settings()
+                    )
+                )
+                atexit.register(PackageManager._scan_pool.shutdown)
+            return PackageManager._scan_pool
+
+    @staticmethod
+    def set_scan_workers(workers):
+        """Set the number of processes used to scan package files."""
+        with _scan_pool_lock:
+            if PackageManager._scan_pool is not None:
+                PackageManager._scan_pool.shutdown()
+                PackageManager._scan_pool = None
+            PackageManager.scan_workers = max(1, workers)
 
     @staticmethod
     def is_readable_text_file(file_path):
-        mime = magic.Magic(mime=True)
         if os.path.exists(file_path):
-            mimetype = mime.from_file(file_path)
-            if mimetype:
-                if mimetype.startswith('text'):
-                    return True
-                if mimetype == 'application/octet-stream':
-                    return True
+            return PackageManager.is_readable_mimetype(
+                detect_mime(file_path)
+            )
+        return False
+
+    @staticmethod
+    def is_readable_text_buffer(data):
+        return PackageManager.is_readable_mimetype(detect_mime_buffer(data))
+
+    @staticmethod
+    def is_readable_mimetype(mimetype):
+        if mimetype:
+            if mimetype.startswith('text'):
+                return True
+            if mimetype == 'application/octet-stream':
+                return True
         return False
 
     @staticmethod
@@ -167,45 +472,131 @@ class PackageManager:
 
     @staticmethod
     def scan_for_copyright(temp_dir: str) -> List[Dict[str, str]]:
-        lmatcher = LicenseMatcher()
-        copyrights = []
-        pattern = r"[^0-9<>,.()@a-zA-Z-\s]+"
+        file_paths = []
         for root, dirs, files in os.walk(temp_dir):
             # Exclude .git directories
             dirs[:] = [d for d in dirs if d.lower() != '.git']
             for file in files:
-                file_path = os.path.join(root, file)
-                if PackageManager.is_readable_text_file(file_path):
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            for line in f:
-                                clean_line = line.strip().lower()
-                                if (
-                                    "copyright " in clean_line and
-                                    len(clean_line) <= 50 and
-                                    "yyyy" not in clean_line
-                                ):
-                                    clean_line = re.sub(
-                                        pattern, "", clean_line
-                                    )
-                                    if (
-                                        clean_line.startswith('copyright') or
-                                        " copyright" in clean_line
-                                    ):
-                                        copyrs = lmatcher.extract_copyright_info(clean_line, False)
-                                        if copyrs and isinstance(copyrs, list):
-                                            for entry in copyrs:
-                                                if isinstance(entry, dict):
-                                                    year = entry.get('year', 'Unknown')
-                                                    holder = entry.get('holder', 'Unknown')
-                                                    copyrights.append({
-                                                        "file": file_path,
-                                                        "line": clean_line
-                                                    })
-                    except UnicodeDecodeError:
-                        continue
+                file_paths.append(os.path.join(root, file))
+        return PackageManager.scan_paths('copyright', file_paths)[1]
+
+    @staticmethod
+    def scan_copyright_file(file_path, lmatcher):
+        if PackageManager.is_readable_text_file(file_path):
+            with mapped_file(file_path) as data:
+                return PackageManager.scan_copyright_lines(
+                    file_path,
+                    PackageManager.copyright_candidates(data),
+                    lmatcher
+                )
+        return []
+
+    @staticmethod
+    def copyright_candidates(data):
+        """Yield the decoded lines of data that mention "copyright ".
+
+        data is bytes or a memory map. The keyword is searched for in the
+        raw bytes and only the lines around each hit are decoded, each on
+        its own, so the cost follows the number of hits and one badly
+        encoded line doesn't hide the rest of the file. Lines are split on
+        any newline convention, as when reading in text mode.
+        """
+        pos = 0
+        for hit in _find_lowered(data, COPYRIGHT_KEYWORD):
+            if hit < pos:
+                # Another hit on a line that was already yielded
+                continue
+            # pos is the start of the file or the previous line's end, so
+            # looking back no further than it keeps the scan linear
+            start = max(
+                data.rfind(b'\n', pos, hit),
+                data.rfind(b'\r', pos, hit),
+                pos - 1
+            ) + 1
+            line_end = LINE_END.search(data, hit + len(COPYRIGHT_KEYWORD))
+            pos = line_end.start() if line_end else len(data)
+            line = decode_text(data[start:pos])
+            if line is not None:
+                yield line
+
+    @staticmethod
+    def scan_copyright_lines(file_path, lines, lmatcher):
+        copyrights = []
+        pattern = r"[^0-9<>,.()@a-zA-Z-\s]+"
+        try:
+            for line in lines:
+                clean_line = line.strip().lower()
+                if (
+                    "copyright " in clean_line and
+                    len(clean_line) <= 50 and
+                    "yyyy" not in clean_line
+                ):
+                    clean_line = re.sub(
+                        pattern, "", clean_line
+                    )
+                    if (
+                        clean_line.startswith('copyright') or
+                        " copyright" in clean_line
+                    ):
+                        copyrs = _copyright_memo.extract(clean_line, lmatcher)
+                        if copyrs and isinstance(copyrs, list):
+                            for entry in copyrs:
+                                if isinstance(entry, dict):
+                                    year = entry.get('year', 'Unknown')
+                                    holder = entry.get('holder', 'Unknown')
+                                    copyrights.append({
+                                        "file": file_path,
+                                        "line": clean_line
+                                    })
+        except UnicodeDecodeError:
+            pass
         return copyrights
 
+    @staticmethod
+    def scan_archive(
+        file_path: str,
+        patterns: List[str],
+        root: str
+    ):
+        """Scan archive members in place, without extracting to disk.
+
+        Returns what scan_tree would give for the archive extracted into
+        root; member paths are reported relative to root.
+        """
+        lmatcher = get_license_matcher()
+        limit = PackageManager.copyright_header_bytes
+        found_files = []
+        copyrights = []
+        truncated = []
+        policy = utils.EXTRACT_POLICY
+        for name, size, member in iter_archive(file_path):
+            deadline.check()
+            parts = name.split('/')
+            # Exclude .git directories
+            if any(part.lower() == '.git' for part in parts[:-1]):
+                continue
+            if policy is not None and not policy.wants(name, size):
+                continue
+            head = member.read(2048)
+            if not PackageManager.is_readable_text_buffer(head):
+                continue
+            is_license = any(
+                re.search(pattern, parts[-1], re.IGNORECASE)
+                for pattern in patterns
+            )
+            if is_license or limit is None:
+                data = head + member.read()
+            else:
+                # One byte past the budget shows the member was cut short
+                data = head + member.read(max(0, limit + 1 - len(head)))
+            files, copyhits, cut = PackageManager.scan_file_data(
+                os.path.join(root, name), data, is_license, lmatcher
+            )
+            found_files.extend(files)
+            copyrights.extend(copyhits)
+            truncated.extend(cut)
+        return found_files, copyrights, truncated
+
     @staticmethod
     def serialize_output(data):
         return json.dumps(data, indent=4)
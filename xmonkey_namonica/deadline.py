@@ -0,0 +1,54 @@
+import time
+import threading
+from contextlib import contextmanager
+from .errors import DeadlineExceeded
+
+# Deadline (a time.monotonic() value) of the PURL the thread works on.
+# Long-running steps call check() between units of work, and network and
+# subprocess calls cap their timeouts with timeout(), so a PURL past its
+# deadline stops at the next such point.
+_local = threading.local()
+
+
+@contextmanager
+def budget(deadline):
+    """Apply deadline, or no deadline if None, to work in this block."""
+    previous = getattr(_local, "deadline", None)
+    _local.deadline = deadline
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+
+def start(seconds):
+    """Deadline for work that starts now and may take seconds, or None."""
+    return time.monotonic() + seconds if seconds else None
+
+
+def remaining():
+    """Seconds left before the deadline, or None without one."""
+    deadline = getattr(_local, "deadline", None)
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check():
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded("Deadline exceeded")
+
+
+def timeout(seconds):
+    """Cap a timeout of seconds at the time left before the deadline.
+
+    Raises DeadlineExceeded when the deadline has already passed.
+    """
+    check()
+    left = remaining()
+    if left is None:
+        return seconds
+    if seconds is None:
+        return left
+    return min(seconds, left)
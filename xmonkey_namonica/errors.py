@@ -0,0 +1,48 @@
+class PackageError(Exception):
+    """A package that can't be processed; transient if a retry may help."""
+
+    def __init__(self, message, transient=False):
+        super().__init__(message)
+        self.transient = transient
+
+
+class DeadlineExceeded(PackageError):
+    """A package that ran past its time budget."""
+
+
+def transient_status(status_code):
+    """Whether an HTTP reply with status_code may succeed if retried."""
+    return status_code == 429 or status_code >= 500
+
+
+def is_transient(error):
+    """Whether error is worth retrying: network failures, 429 and 5xx."""
+    if isinstance(error, PackageError):
+        return error.transient
+    import requests
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, requests.HTTPError):
+        response = error.response
+        return response is not None and transient_status(
+            response.status_code
+        )
+    return False
+
+
+def error_result(purl, error):
+    """Report for a PURL whose processing raised error."""
+    return {
+        'license_files': [],
+        'copyrights': [],
+        'truncated_files': [],
+        'license': (
+            'TIMEOUT' if isinstance(error, DeadlineExceeded) else 'ERROR'
+        ),
+        'url': None,
+        'error': {
+            'type': type(error).__name__,
+            'message': str(error),
+            'transient': is_transient(error),
+        },
+    }
@@ -0,0 +1,69 @@
+import logging
+import importlib
+import threading
+
+# PURL type -> "module:Class" of its handler. Handlers are imported on
+# first use so a run only loads the ecosystems (and dependencies) it needs.
+HANDLERS = {
+    "npm": "xmonkey_namonica.handlers.npm_handler:NpmHandler",
+    "cargo": "xmonkey_namonica.handlers.cargo_handler:CargoHandler",
+    "pypi": "xmonkey_namonica.handlers.pypi_handler:PypiHandler",
+    "nuget": "xmonkey_namonica.handlers.nuget_handler:NugetHandler",
+    "golang": "xmonkey_namonica.handlers.golang_handler:GolangHandler",
+    "gem": "xmonkey_namonica.handlers.gem_handler:GemHandler",
+    "conda": "xmonkey_namonica.handlers.conda_handler:CondaHandler",
+    "generic": "xmonkey_namonica.handlers.gen_handler:GenericHandler",
+    "github": "xmonkey_namonica.handlers.github_handler:GithubHandler",
+}
+# Installed packages add or replace handlers with entry points in this
+# group, named after the PURL type, e.g. maven = "acme.maven:MavenHandler"
+ENTRY_POINT_GROUP = "xmonkey_namonica.handlers"
+
+_loaded = {}
+_plugins_lock = threading.Lock()
+_plugins_loaded = False
+
+
+def register_handler(purl_type, handler):
+    """Register a handler class, or its "module:Class" path, for a type."""
+    purl_type = purl_type.lower()
+    HANDLERS[purl_type] = handler
+    _loaded.pop(purl_type, None)
+
+
+def _load_plugins():
+    global _plugins_loaded
+    with _plugins_lock:
+        if _plugins_loaded:
+            return
+        _plugins_loaded = True
+        from importlib import metadata
+        entry_points = metadata.entry_points()
+        if hasattr(entry_points, "select"):
+            entry_points = entry_points.select(group=ENTRY_POINT_GROUP)
+        else:
+            entry_points = entry_points.get(ENTRY_POINT_GROUP, [])
+        for entry_point in entry_points:
+            logging.info(
+                f"Handler for {entry_point.name} from {entry_point.value}"
+            )
+            register_handler(entry_point.name, entry_point.value)
+
+
+def load_handler(purl_type):
+    """Return the handler class registered for purl_type.
+
+    Raises ValueError when no handler, built-in or plugin, handles it.
+    """
+    _load_plugins()
+    purl_type = purl_type.lower()
+    if purl_type not in _loaded:
+        if purl_type not in HANDLERS:
+            raise ValueError(f"Unsupported PURL type {purl_type}")
+        handler = HANDLERS[purl_type]
+        if isinstance(handler, str):
+            module_name, class_name = handler.split(":")
+            module = importlib.import_module(module_name)
+            handler = getattr(module, class_name)
+        _loaded[purl_type] = handler
+    return _loaded[purl_type]
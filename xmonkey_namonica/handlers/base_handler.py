@@ -1,17 +1,38 @@
 from abc import ABC, abstractmethod
 import os
 import shutil
+import logging
 from ..common import PackageManager
+from ..utils import temp_directory, LICENSE_PATTERNS
 
 
 class BaseHandler(ABC):
-    def __init__(self, purl):
-        self.purl_details = PackageManager.parse_purl(purl)
+    license_patterns = LICENSE_PATTERNS
+
+    def __init__(self, purl, purl_details=None):
+        # Callers that dispatched on the parsed PURL pass it along
+        if purl_details is None:
+            purl_details = PackageManager.parse_purl(purl)
+        self.purl_details = purl_details
         self.temp_dir = None
+        # Set by handlers whose download is a single tar or zip archive
+        self.archive_path = None
+        # Files whose copyright scan stopped at the header budget
+        self.truncated_files = []
 
-    @abstractmethod
     def fetch(self):
-        """Fetch the package based on the PURL details."""
+        """Download, unpack and scan the package in a temporary directory."""
+        with temp_directory() as temp_dir:
+            self.temp_dir = temp_dir
+            if self.download():
+                self.unpack()
+                self.scan()
+            else:
+                self.placehldr()
+
+    @abstractmethod
+    def download(self):
+        """Download the package into temp_dir, return False if missing."""
         pass
 
     @abstractmethod
@@ -24,6 +45,23 @@ class BaseHandler(ABC):
         """Scan the unpacked package for relevant data."""
         pass
 
+    def scan_in_archive(self):
+        """Whether the package is scanned in place rather than unpacked."""
+        return bool(self.archive_path) and PackageManager.scan_archives
+
+    def scan_package(self):
+        """Return the license files and copyrights found in the package."""
+        if self.scan_in_archive():
+            files, copyhits, truncated = PackageManager.scan_archive(
+                self.archive_path, self.license_patterns, self.temp_dir
+            )
+        else:
+            files, copyhits, truncated = PackageManager.scan_tree(
+                self.temp_dir, self.license_patterns
+            )
+        self.truncated_files = truncated
+        return files, copyhits
+
     @abstractmethod
     def generate_report(self):
         """Generate a report from the scanned data."""
@@ -34,8 +72,23 @@ class BaseHandler(ABC):
         """Obtain the license from repo or package metadata."""
         pass
 
+    def metadata_url(self, pkg_name=None):
+        """URL of the registry document shared by every version, if any."""
+        return None
+
+    def placehldr(self):
+        """Record placeholder results for a package that can't be found."""
+        results = {}
+        logging.info("Placeholder results...")
+        results['license_files'] = {}
+        results['copyrights'] = {}
+        results['truncated_files'] = []
+        results['license'] = 'HTTP-404'
+        results['url'] = self.repo_url
+        self.results = results
+
     def cleanup(self):
         """Remove the temporary directory created for package handling."""
         if self.temp_dir and os.path.exists(self.temp_dir):
             shutil.rmtree(self.temp_dir)
-            print(f"Cleaned up temporary directory: {self.temp_dir}")
+            logging.info(f"Cleaned up temporary directory: {self.temp_dir}")
@@ -1,40 +1,27 @@
 import os
-import magic
 import logging
-import requests
 from .base_handler import BaseHandler
+from .. import http_client
+from ..errors import PackageError
 from urllib.parse import urlparse, parse_qs
 from ..common import PackageManager, temp_directory
 from ..utils import download_file, temp_directory, check_and_extract
 from ..utils import extract_zip, extract_tar, extract_bz2
+from ..utils import detect_mime
 
 
 class CondaHandler(BaseHandler):
-    def fetch(self):
+    def download(self):
         download_url = self.construct_download_url()
         self.repo_url = download_url
-        with temp_directory() as temp_dir:
-            package_file_path = os.path.join(
-                temp_dir,
-                self.conda_pkg
-            )
-            rst = download_file(download_url, package_file_path)
-            if rst:
-                logging.info(f"Downloaded package to {package_file_path}")
-                self.temp_dir = temp_dir
-                self.unpack()
-                self.scan()
-            else:
-                self.placehldr()
-
-    def placehldr(self):
-        results = {}
-        logging.info("Placeholder results...")
-        results['license_files'] = {}
-        results['copyrights'] = {}
-        results['license'] = 'HTTP-404'
-        results['url'] = self.repo_url
-        self.results = results
+        package_file_path = os.path.join(
+            self.temp_dir,
+            self.conda_pkg
+        )
+        rst = download_file(download_url, package_file_path)
+        if rst:
+            logging.info(f"Downloaded package to {package_file_path}")
+        return rst
 
     def unpack(self):
         if self.temp_dir:
@@ -42,8 +29,7 @@ class CondaHandler(BaseHandler):
                 self.temp_dir,
                 self.conda_pkg
             )
-            mime = magic.Magic(mime=True)
-            mimetype = mime.from_file(package_file_path)
+            mimetype = detect_mime(package_file_path)
             if 'gzip' in mimetype:
                 extract_zip(package_file_path, self.temp_dir)
                 check_and_extract(self.temp_dir, self.temp_dir)
@@ -57,19 +43,16 @@ class CondaHandler(BaseHandler):
                 check_and_extract(self.temp_dir, self.temp_dir)
                 logging.info(f"Unpacked package in {self.temp_dir}")
             else:
-                logging.error(f"MimeType not supported {mimetype}")
                 logging.error(f"Error unpacking file in {self.temp_dir}")
-                exit()
+                raise PackageError(f"MimeType not supported {mimetype}")
 
     def scan(self):
         results = {}
         logging.info("Scanning package contents...")
-        files = PackageManager.scan_for_files(
-            self.temp_dir, ['COPYRIGHT', 'NOTICES', 'LICENSE', 'COPYING']
-        )
+        files, copyhits = self.scan_package()
         results['license_files'] = files
-        copyhits = PackageManager.scan_for_copyright(self.temp_dir)
         results['copyrights'] = copyhits
+        results['truncated_files'] = self.truncated_files
         pkg_name = self.purl_details['name']
         results['license'] = self.get_license(pkg_name)
         results['url'] = self.repo_url
@@ -88,9 +71,8 @@ class CondaHandler(BaseHandler):
         return self.results
 
     def get_license(self, pkg_name):
-        channel = 'conda-forge'
-        url = f"https://api.anaconda.org/package/{channel}/{pkg_name}"
-        response = requests.get(url)
+        url = self.metadata_url(pkg_name)
+        response = http_client.get_metadata(url)
         if response.status_code == 200:
             data = response.json()
             license_info = data.get('license', '')
@@ -99,6 +81,11 @@ class CondaHandler(BaseHandler):
             logging.error("Can't obtain data from Crates.IO")
             return ''
 
+    def metadata_url(self, pkg_name=None):
+        pkg_name = pkg_name or self.purl_details['name']
+        channel = 'conda-forge'
+        return f"https://api.anaconda.org/package/{channel}/{pkg_name}"
+
     def construct_download_url(self):
         base_url = "https://anaconda.org/conda-forge/"
         package_name = self.purl_details['name']
@@ -107,18 +94,15 @@ class CondaHandler(BaseHandler):
         if 'build' in qualifiers:
             build = qualifiers['build'][0]
         else:
-            logging.error(f"Must provide a valid build")
-            exit()
+            raise PackageError("Must provide a valid build")
         if 'channel' in qualifiers:
             channel = qualifiers['channel'][0]
         else:
-            logging.error(f"Must provide a valid channel")
-            exit()
+            raise PackageError("Must provide a valid channel")
         if 'subdir' in qualifiers:
             subdir = qualifiers['subdir'][0]
         else:
-            logging.error(f"Must provide a valid subdir")
-            exit()
+            raise PackageError("Must provide a valid subdir")
         # Form the download URL
         conda_repo = f"{base_url}{package_name}/{version}/download/{subdir}/"
         conda_pkg = f"{package_name}-{version}-{build}.tar.bz2"
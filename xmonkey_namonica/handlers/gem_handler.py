@@ -1,32 +1,31 @@
 import os
-import magic
 import shutil
 import hashlib
 import logging
-import requests
 import subprocess
 from bs4 import BeautifulSoup
 from .base_handler import BaseHandler
+from .. import http_client
+from ..errors import PackageError, transient_status
+from ..cache import get_artifact_cache
 from urllib.parse import urlparse, parse_qs
 from ..common import PackageManager, temp_directory
-from ..utils import download_file, temp_directory
+from ..utils import download_file, temp_directory, stream_to_file
 from ..utils import extract_tar, extract_zip
+from ..utils import detect_mime, run_git
 
 
 class GemHandler(BaseHandler):
-    def fetch(self):
+    def download(self):
         repo_url = self.construct_repo_url()
         self.repo_url = repo_url
-        with temp_directory() as temp_dir:
-            self.temp_dir = temp_dir
-            if 'rubygem' in repo_url:
-                self.fetch_file(repo_url)
-                logging.info(f"File downloaded in {self.temp_dir}")
-                self.unpack()
-            else:
-                self.clone_repo(repo_url)
-                logging.info(f"Repo cloned to {self.temp_dir}")
-            self.scan()
+        if 'rubygem' in repo_url:
+            self.fetch_file(repo_url)
+            logging.info(f"File downloaded in {self.temp_dir}")
+        else:
+            self.clone_repo(repo_url)
+            logging.info(f"Repo cloned to {self.temp_dir}")
+        return True
 
     def construct_repo_url(self):
         pkg_name = self.purl_details['name']
@@ -34,13 +33,14 @@ class GemHandler(BaseHandler):
         download_url = (
             f"https://rubygems.org/downloads/{pkg_name}-{pkg_version}.gem"
         )
-        response = requests.get(download_url)
+        # Only check the gem exists; fetch_file streams it later
+        response = http_client.head(download_url, allow_redirects=True)
         if response.status_code == 200:
             return download_url
         else:
-            api_url = f"https://rubygems.org/api/v1/gems/{pkg_name}.json"
+            api_url = self.metadata_url(pkg_name)
             logging.info(f"api_url: {api_url}")
-            response = requests.get(api_url)
+            response = http_client.get_metadata(api_url)
             if response.status_code == 200:
                 data = response.json()
                 gem_url = data.get('gem_uri', '')
@@ -60,23 +60,26 @@ class GemHandler(BaseHandler):
                 elif 'github.com' in homepage_url:
                     repo_url = homepage_url
                 else:
-                    logging.error(
+                    raise PackageError(
                         f"Invalid source URL: {source_code_url} {homepage_url}"
                     )
-                    exit()
             else:
-                logging.error(f"Failed to fetch data: {response.status_code}")
-                exit()
+                raise PackageError(
+                    f"Failed to fetch data: {response.status_code}",
+                    transient=transient_status(response.status_code)
+                )
             return f"{repo_url}.git"
 
     def unpack(self):
-        if self.temp_dir:
-            package_file_path = os.path.join(
-                self.temp_dir,
-                "downloaded_file"
-            )
-            mime = magic.Magic(mime=True)
-            mimetype = mime.from_file(package_file_path)
+        if not self.temp_dir:
+            return
+        package_file_path = os.path.join(
+            self.temp_dir,
+            "downloaded_file"
+        )
+        # Cloned repositories have nothing to unpack
+        if os.path.isfile(package_file_path):
+            mimetype = detect_mime(package_file_path)
             if 'gzip' in mimetype:
                 extract_zip(package_file_path, self.temp_dir)
                 logging.info(f"Unpacked package in {self.temp_dir}")
@@ -86,19 +89,16 @@ class GemHandler(BaseHandler):
                 # extract_tar(self.temp_dir+'/metadata.gz', self.temp_dir)
                 logging.info(f"Unpacked package in {self.temp_dir}")
             else:
-                logging.error(f"MimeType not supported {mimetype}")
                 logging.error(f"Error unpacking file in {self.temp_dir}")
-                exit()
+                raise PackageError(f"MimeType not supported {mimetype}")
 
     def scan(self):
         results = {}
         logging.info("Scanning package contents...")
-        files = PackageManager.scan_for_files(
-            self.temp_dir, ['COPYRIGHT', 'NOTICES', 'LICENSE', 'COPYING']
-        )
+        files, copyhits = self.scan_package()
         results['license_files'] = files
-        copyhits = PackageManager.scan_for_copyright(self.temp_dir)
         results['copyrights'] = copyhits
+        results['truncated_files'] = self.truncated_files
         pkg_name = self.purl_details['name']
         results['license'] = self.get_license(pkg_name)
         results['url'] = self.repo_url
@@ -117,8 +117,8 @@ class GemHandler(BaseHandler):
         return self.results
 
     def get_license(self, pkg_name):
-        url = f"https://rubygems.org/api/v1/gems/{pkg_name}.json"
-        response = requests.get(url)
+        url = self.metadata_url(pkg_name)
+        response = http_client.get_metadata(url)
         if response.status_code == 200:
             data = response.json()
             license_info = data.get('licenses') or data.get('license')
@@ -132,32 +132,36 @@ class GemHandler(BaseHandler):
             logging.error("Can't obtain data from Crates.IO")
             return ''
 
+    def metadata_url(self, pkg_name=None):
+        pkg_name = pkg_name or self.purl_details['name']
+        return f"https://rubygems.org/api/v1/gems/{pkg_name}.json"
+
     def fetch_file(self, url):
-        response = requests.get(url)
-        if response.status_code == 200:
-            file_data = response.content
-            package_file_path = os.path.join(
-                self.temp_dir,
-                "downloaded_file"
-            )
-            with open(package_file_path, "wb") as file:
-                file.write(file_data)
-            logging.info("File downloaded successfully.")
-        else:
-            raise ConnectionError("Failed to download the file.")
+        package_file_path = os.path.join(
+            self.temp_dir,
+            "downloaded_file"
+        )
+        artifacts = get_artifact_cache()
+        if artifacts is not None and artifacts.fetch(url, package_file_path):
+            return
+        with http_client.get(url, stream=True) as response:
+            if response.status_code != 200:
+                raise PackageError(
+                    f"Failed to download {url}: HTTP {response.status_code}",
+                    transient=transient_status(response.status_code)
+                )
+            hash_sha256 = stream_to_file(response, package_file_path)
+        logging.info("File downloaded successfully.")
+        if artifacts is not None:
+            artifacts.store(url, package_file_path, hash_sha256.hexdigest())
 
     def clone_repo(self, repo_url):
         repo = repo_url[0]
         try:
-            subprocess.run(
-                ["git", "clone", repo, self.temp_dir],
-                check=True,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
+            run_git("clone", repo, self.temp_dir)
             # Here should clone base on version. Check GoLang
             logging.info(f"Repository cloned successfully to {self.temp_dir}")
         except subprocess.CalledProcessError as e:
-            print(f"Failed to clone repository: {e}")
+            logging.error(f"Failed to clone repository: {e}")
             # shutil.rmtree(self.temp_dir)
             raise
@@ -1,45 +1,47 @@
 import os
-import magic
 import shutil
 import hashlib
 import logging
-import requests
 import subprocess
 from .base_handler import BaseHandler
+from .. import http_client
+from ..errors import PackageError, transient_status
+from ..cache import get_artifact_cache, is_sha256_prefix
 from urllib.parse import urlparse, parse_qs
 from ..common import PackageManager, temp_directory
 from ..utils import download_file, temp_directory, check_and_extract
+from ..utils import stream_to_file
 from ..utils import extract_zip, extract_tar, extract_bz2
+from ..utils import detect_mime, run_git
 
 
 class GenericHandler(BaseHandler):
-    def fetch(self):
+    def download(self):
         details = self.purl_details
         qualifiers = details.get('qualifiers', {})
         download_url = qualifiers.get('download_url', [None])[0]
         vcs_url = qualifiers.get('vcs_url', [None])[0]
         checksum = qualifiers.get('checksum', [None])[0]
-        with temp_directory() as temp_dir:
-            self.temp_dir = temp_dir
-            if download_url:
-                self.repo_url = download_url
-                self.download_file(download_url, checksum)
-                logging.info(f"File downloaded in {self.temp_dir}")
-                self.unpack()
-            elif vcs_url:
-                self.repo_url = vcs_url
-                self.clone_repository(vcs_url)
-                logging.info(f"Repo cloned to {self.temp_dir}")
-            self.scan()
+        if download_url:
+            self.repo_url = download_url
+            self.download_file(download_url, checksum)
+            logging.info(f"File downloaded in {self.temp_dir}")
+        elif vcs_url:
+            self.repo_url = vcs_url
+            self.clone_repository(vcs_url)
+            logging.info(f"Repo cloned to {self.temp_dir}")
+        return True
 
     def unpack(self):
-        if self.temp_dir:
-            package_file_path = os.path.join(
-                self.temp_dir,
-                "downloaded_file"
-            )
-            mime = magic.Magic(mime=True)
-            mimetype = mime.from_file(package_file_path)
+        if not self.temp_dir:
+            return
+        package_file_path = os.path.join(
+            self.temp_dir,
+            "downloaded_file"
+        )
+        # Cloned repositories have nothing to unpack
+        if os.path.isfile(package_file_path):
+            mimetype = detect_mime(package_file_path)
             if 'gzip' in mimetype:
                 extract_tar(package_file_path, self.temp_dir)
                 logging.info(f"Unpacked package in {self.temp_dir}")
@@ -47,27 +49,25 @@ class GenericHandler(BaseHandler):
                 extract_tar(package_file_path, self.temp_dir)
                 check_and_extract(self.temp_dir, self.temp_dir)
                 logging.info(f"Unpacked package in {self.temp_dir}")
-            elif 'zip' in mimetype:
-                extract_zip(package_file_path, self.temp_dir)
-                logging.info(f"Unpacked package in {self.temp_dir}")
             elif 'bzip2' in mimetype:
+                # Before 'zip', which application/x-bzip2 also contains
                 extract_bz2(package_file_path, self.temp_dir)
                 check_and_extract(self.temp_dir, self.temp_dir)
                 logging.info(f"Unpacked package in {self.temp_dir}")
+            elif 'zip' in mimetype:
+                extract_zip(package_file_path, self.temp_dir)
+                logging.info(f"Unpacked package in {self.temp_dir}")
             else:
-                logging.error(f"MimeType not supported {mimetype}")
                 logging.error(f"Error unpacking file in {self.temp_dir}")
-                exit()
+                raise PackageError(f"MimeType not supported {mimetype}")
 
     def scan(self):
         results = {}
         logging.info("Scanning package contents...")
-        files = PackageManager.scan_for_files(
-            self.temp_dir, ['COPYRIGHT', 'NOTICES', 'LICENSE', 'COPYING']
-        )
+        files, copyhits = self.scan_package()
         results['license_files'] = files
-        copyhits = PackageManager.scan_for_copyright(self.temp_dir)
         results['copyrights'] = copyhits
+        results['truncated_files'] = self.truncated_files
         # Needs OSLiLi implementation
         results['license'] = ''
         results['url'] = self.repo_url
@@ -88,29 +88,51 @@ class GenericHandler(BaseHandler):
     def get_license(self, file_url):
         return ''
 
-    def verify_checksum(self, data, provided_checksum):
+    def verify_checksum(self, hash_sha256, provided_checksum):
+        """Check a sha256 built while streaming against the qualifier."""
+        return self.checksum_matches(
+            hash_sha256.hexdigest(), provided_checksum
+        )
+
+    @staticmethod
+    def checksum_matches(full_checksum, provided_checksum):
         if ':' in provided_checksum:
             _, provided_checksum = provided_checksum.split(':', 1)
-        hash_sha256 = hashlib.sha256()
-        hash_sha256.update(data)
-        full_checksum = hash_sha256.hexdigest()
-        return full_checksum.startswith(provided_checksum)
+        return full_checksum.startswith(provided_checksum.lower())
 
     def download_file(self, url, checksum=None):
-        response = requests.get(url)
-        if response.status_code == 200:
-            file_data = response.content
-            if checksum and not self.verify_checksum(file_data, checksum):
-                raise ValueError("Checksum verification failed!")
-            package_file_path = os.path.join(
-                self.temp_dir,
-                "downloaded_file"
+        package_file_path = os.path.join(
+            self.temp_dir,
+            "downloaded_file"
+        )
+        artifacts = get_artifact_cache()
+        if artifacts is not None:
+            # Look up by checksum, falling back to the URL for checksums
+            # that are too short or not hex digits
+            prefix = checksum.split(':', 1)[-1].lower() if checksum else None
+            digest = artifacts.fetch(
+                url, package_file_path,
+                prefix if is_sha256_prefix(prefix) else None
             )
-            with open(package_file_path, "wb") as file:
-                file.write(file_data)
-            logging.info("File downloaded successfully.")
-        else:
-            raise ConnectionError("Failed to download the file.")
+            if digest and (
+                not checksum or self.checksum_matches(digest, checksum)
+            ):
+                return
+            if digest:
+                os.remove(package_file_path)
+        with http_client.get(url, stream=True) as response:
+            if response.status_code != 200:
+                raise PackageError(
+                    f"Failed to download {url}: HTTP {response.status_code}",
+                    transient=transient_status(response.status_code)
+                )
+            hash_sha256 = stream_to_file(response, package_file_path)
+        if checksum and not self.verify_checksum(hash_sha256, checksum):
+            os.remove(package_file_path)
+            raise ValueError("Checksum verification failed!")
+        logging.info("File downloaded successfully.")
+        if artifacts is not None:
+            artifacts.store(url, package_file_path, hash_sha256.hexdigest())
 
     def clone_repository(self, vcs_url):
         try:
@@ -122,22 +144,11 @@ class GenericHandler(BaseHandler):
                 repo_url, commit = repo_url.rsplit('@', 1)
             else:
                 commit = None
-            subprocess.run(
-                ["git", "clone", repo_url, self.temp_dir],
-                check=True,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
+            run_git("clone", repo_url, self.temp_dir)
             if commit is not None:
-                subprocess.run(
-                    ["git", "checkout", commit],
-                    check=True,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                    cwd=self.temp_dir
-                )
+                run_git("checkout", commit, cwd=self.temp_dir)
             logging.info(f"Repository cloned successfully to {self.temp_dir}")
         except subprocess.CalledProcessError as e:
-            print(f"Failed to clone repository: {e}")
+            logging.error(f"Failed to clone repository: {e}")
             shutil.rmtree(self.temp_dir)
             raise
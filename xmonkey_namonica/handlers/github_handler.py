@@ -1,31 +1,31 @@
 import os
-import magic
 import shutil
 import hashlib
 import logging
-import requests
 import subprocess
 from .base_handler import BaseHandler
+from .. import http_client
+from ..errors import PackageError, transient_status
+from ..cache import get_artifact_cache
 from urllib.parse import urlparse, parse_qs
 from ..common import PackageManager, temp_directory
 from ..utils import download_file, temp_directory, extract_tar
+from ..utils import stream_to_file
+from ..utils import detect_mime, run_git
 
 
 class GithubHandler(BaseHandler):
-    def fetch(self):
+    def download(self):
         self.base_url = "https://github.com/"
         repo_url = self.construct_repo_url()
         self.repo_url = repo_url
-        with temp_directory() as temp_dir:
-            self.temp_dir = temp_dir
-            if self.purl_details['subpath']:
-                self.fetch_file(repo_url)
-                logging.info(f"File downloaded in {self.temp_dir}")
-                self.unpack()
-            else:
-                self.clone_repo(repo_url)
-                logging.info(f"Repo cloned to {self.temp_dir}")
-            self.scan()
+        if self.purl_details['subpath']:
+            self.fetch_file(repo_url)
+            logging.info(f"File downloaded in {self.temp_dir}")
+        else:
+            self.clone_repo(repo_url)
+            logging.info(f"Repo cloned to {self.temp_dir}")
+        return True
 
     def construct_repo_url(self):
         namespace = self.purl_details['namespace']
@@ -35,30 +35,29 @@ class GithubHandler(BaseHandler):
         return f"{self.base_url}{namespace}/{name}.git", version
 
     def unpack(self):
-        if self.temp_dir:
-            package_file_path = os.path.join(
-                self.temp_dir,
-                "downloaded_file"
-            )
-            mime = magic.Magic(mime=True)
-            mimetype = mime.from_file(package_file_path)
+        if not self.temp_dir:
+            return
+        package_file_path = os.path.join(
+            self.temp_dir,
+            "downloaded_file"
+        )
+        # Cloned repositories have nothing to unpack
+        if os.path.isfile(package_file_path):
+            mimetype = detect_mime(package_file_path)
             if 'gzip' in mimetype:
                 extract_tar(package_file_path, self.temp_dir)
                 logging.info(f"Unpacked package in {self.temp_dir}")
             else:
-                logging.error(f"MimeType not supported {mimetype}")
                 logging.error(f"Error unpacking file in {self.temp_dir}")
-                exit()
+                raise PackageError(f"MimeType not supported {mimetype}")
 
     def scan(self):
         results = {}
         logging.info("Scanning package contents...")
-        files = PackageManager.scan_for_files(
-            self.temp_dir, ['COPYRIGHT', 'NOTICES', 'LICENSE', 'COPYING']
-        )
+        files, copyhits = self.scan_package()
         results['license_files'] = files
-        copyhits = PackageManager.scan_for_copyright(self.temp_dir)
         results['copyrights'] = copyhits
+        results['truncated_files'] = self.truncated_files
         results['license'] = self.get_license(self.repo_url)
         results['url'] = self.repo_url[0]
         self.results = results
@@ -81,7 +80,7 @@ class GithubHandler(BaseHandler):
             repo_url = repo_url[:-4]
         repo_path = repo_url.split("github.com/")[1]
         api_url = f"https://api.github.com/repos/{repo_path}/license"
-        response = requests.get(api_url)
+        response = http_client.get_metadata(api_url)
         if response.status_code == 200:
             data = response.json()
             license_name = data.get('license', {}).get('name', '')
@@ -96,38 +95,33 @@ class GithubHandler(BaseHandler):
             return ''
 
     def fetch_file(self, url):
-        response = requests.get(url)
-        if response.status_code == 200:
-            file_data = response.content
-            package_file_path = os.path.join(
-                self.temp_dir,
-                "downloaded_file"
-            )
-            with open(package_file_path, "wb") as file:
-                file.write(file_data)
-            logging.info("File downloaded successfully.")
-        else:
-            raise ConnectionError("Failed to download the file.")
+        package_file_path = os.path.join(
+            self.temp_dir,
+            "downloaded_file"
+        )
+        artifacts = get_artifact_cache()
+        if artifacts is not None and artifacts.fetch(url, package_file_path):
+            return
+        with http_client.get(url, stream=True) as response:
+            if response.status_code != 200:
+                raise PackageError(
+                    f"Failed to download {url}: HTTP {response.status_code}",
+                    transient=transient_status(response.status_code)
+                )
+            hash_sha256 = stream_to_file(response, package_file_path)
+        logging.info("File downloaded successfully.")
+        if artifacts is not None:
+            artifacts.store(url, package_file_path, hash_sha256.hexdigest())
 
     def clone_repo(self, repo_url):
         repo = repo_url[0]
         try:
-            subprocess.run(
-                ["git", "clone", repo, self.temp_dir],
-                check=True,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
+            run_git("clone", repo, self.temp_dir)
             if self.purl_details['version']:
                 version = self.purl_details['version']
-                subprocess.run(
-                    ["git", "-C", self.temp_dir, "checkout", version],
-                    check=True,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL
-                )
+                run_git("-C", self.temp_dir, "checkout", version)
             logging.info(f"Repository cloned successfully to {self.temp_dir}")
         except subprocess.CalledProcessError as e:
-            print(f"Failed to clone repository: {e}")
+            logging.error(f"Failed to clone repository: {e}")
             # shutil.rmtree(self.temp_dir)
             raise
@@ -1,6 +1,5 @@
 import os
 import json
-import magic
 import shutil
 import hashlib
 import logging
@@ -9,43 +8,40 @@ import requests
 import subprocess
 from urllib.parse import urlparse, parse_qs
 from bs4 import BeautifulSoup
-from xmonkey_lidy.matcher import LicenseMatcher
 from .base_handler import BaseHandler
+from .. import http_client
+from ..errors import PackageError
 from urllib.parse import urlparse, parse_qs
-from ..common import PackageManager, temp_directory
+from ..common import PackageManager, temp_directory, get_license_matcher
 from ..utils import download_file, temp_directory, check_and_extract
 from ..utils import extract_zip, extract_tar, extract_bz2
+from ..utils import detect_mime
 
 
 class GolangHandler(BaseHandler):
-    def fetch(self):
+    def download(self):
         download_url, license_txt = self.get_package_info()
         self.repo_url = download_url
         self.download_url = download_url
         if license_txt:
-            lmatcher = LicenseMatcher()
-            LiDy_results  = lmatcher.identify_license(
-                license_txt, False, False, False
+            LiDy_results = PackageManager.identify_license(
+                license_txt, get_license_matcher()
             )
             self.spdx_code = LiDy_results.get('SPDX', 'Unknown')
         else:
             self.spdx_code = ''
-        with temp_directory() as temp_dir:
-            self.temp_dir = temp_dir
-            filename = (
-                f"{self.purl_details['version']}.zip"
-            )
-            package_file_path = os.path.join(
-                temp_dir,
-                filename
-            )
-            rst = download_file(download_url, package_file_path)
-            if rst:
-                logging.info(f"Downloaded package in {self.temp_dir}")
-                self.unpack()
-                self.scan()
-            else:
-                self.placehldr()
+        filename = (
+            f"{self.purl_details['version']}.zip"
+        )
+        package_file_path = os.path.join(
+            self.temp_dir,
+            filename
+        )
+        rst = download_file(download_url, package_file_path)
+        if rst:
+            logging.info(f"Downloaded package in {self.temp_dir}")
+            self.archive_path = package_file_path
+        return rst
 
     def get_package_info(self):
         go_proxy = "https://proxy.golang.org"
@@ -67,7 +63,7 @@ class GolangHandler(BaseHandler):
                 for path in license_paths:
                     license_url = f"{raw_base_url}/{branch}/{path}"
                     try:
-                        response = requests.get(license_url)
+                        response = http_client.get_metadata(license_url)
                         if response.status_code == 200:
                             if "Redirecting" in response.text:
                                 license_txt = ''
@@ -81,25 +77,16 @@ class GolangHandler(BaseHandler):
         encoded_module_path = requests.utils.quote(module_path, safe="")
         info_url = f"{go_proxy}/{encoded_module_path}/@v/{version}.info"
         try:
-            response = requests.get(info_url)
+            response = http_client.get_metadata(info_url)
             response.raise_for_status()
             package_info = response.json()
             return f"{go_proxy}/{encoded_module_path}/@v/{version}.zip", license_txt
         except requests.exceptions.RequestException as e:
-            print(f"Error fetching package info: {e}")
+            logging.error(f"Error fetching package info: {e}")
             return None, None
 
-    def placehldr(self):
-        results = {}
-        logging.info("Placeholder results...")
-        results['license_files'] = {}
-        results['copyrights'] = {}
-        results['license'] = 'HTTP-404'
-        results['url'] = self.repo_url
-        self.results = results
-
     def unpack(self):
-        if self.temp_dir:
+        if self.temp_dir and not self.scan_in_archive():
             filename = (
                 f"{self.purl_details['version']}.zip"
             )
@@ -107,8 +94,7 @@ class GolangHandler(BaseHandler):
                 self.temp_dir,
                 filename
             )
-            mime = magic.Magic(mime=True)
-            mimetype = mime.from_file(package_file_path)
+            mimetype = detect_mime(package_file_path)
             if 'gzip' in mimetype:
                 extract_zip(package_file_path, self.temp_dir)
                 logging.info(f"Unpacked package in {self.temp_dir}")
@@ -122,19 +108,16 @@ class GolangHandler(BaseHandler):
                 extract_bz2(package_file_path, self.temp_dir)
                 logging.info(f"Unpacked package in {self.temp_dir}")
             else:
-                logging.error(f"MimeType not supported {mimetype}")
                 logging.error(f"Error unpacking file in {self.temp_dir}")
-                exit()
+                raise PackageError(f"MimeType not supported {mimetype}")
 
     def scan(self):
         results = {}
         logging.info("Scanning package contents...")
-        files = PackageManager.scan_for_files(
-            self.temp_dir, ['COPYRIGHT', 'NOTICES', 'LICENSE', 'COPYING']
-        )
+        files, copyhits = self.scan_package()
         results['license_files'] = files
-        copyhits = PackageManager.scan_for_copyright(self.temp_dir)
         results['copyrights'] = copyhits
+        results['truncated_files'] = self.truncated_files
         self.results = results
         results['license'] = self.spdx_code
         results['url'] = self.repo_url
@@ -1,44 +1,31 @@
 import os
 import logging
-import requests
 from .base_handler import BaseHandler
+from .. import http_client
 from ..common import PackageManager, temp_directory
 from ..utils import download_file, temp_directory, extract_tar
 
 
 class NpmHandler(BaseHandler):
-    def fetch(self):
+    def download(self):
         download_url = self.construct_download_url()
         self.repo_url = download_url
-        with temp_directory() as temp_dir:
-            filename = (
-                f"{self.purl_details['name']}-"
-                f"{self.purl_details['version']}.tgz"
-            )
-            package_file_path = os.path.join(
-                temp_dir,
-                filename
-            )
-            rst = download_file(download_url, package_file_path)
-            if rst:
-                logging.info(f"Downloaded package to {package_file_path}")
-                self.temp_dir = temp_dir
-                self.unpack()
-                self.scan()
-            else:
-                self.placehldr()
-
-    def placehldr(self):
-        results = {}
-        logging.info("Placeholder results...")
-        results['license_files'] = {}
-        results['copyrights'] = {}
-        results['license'] = 'HTTP-404'
-        results['url'] = self.repo_url
-        self.results = results
+        filename = (
+            f"{self.purl_details['name']}-"
+            f"{self.purl_details['version']}.tgz"
+        )
+        package_file_path = os.path.join(
+            self.temp_dir,
+            filename
+        )
+        rst = download_file(download_url, package_file_path)
+        if rst:
+            logging.info(f"Downloaded package to {package_file_path}")
+            self.archive_path = package_file_path
+        return rst
 
     def unpack(self):
-        if self.temp_dir:
+        if self.temp_dir and not self.scan_in_archive():
             filename = (
                 f"{self.purl_details['name']}-"
                 f"{self.purl_details['version']}.tgz"
@@ -53,12 +40,10 @@ class NpmHandler(BaseHandler):
     def scan(self):
         results = {}
         logging.info("Scanning package contents...")
-        files = PackageManager.scan_for_files(
-            self.temp_dir, ['COPYRIGHT', 'NOTICES', 'LICENSE', 'COPYING']
-        )
+        files, copyhits = self.scan_package()
         results['license_files'] = files
-        copyhits = PackageManager.scan_for_copyright(self.temp_dir)
         results['copyrights'] = copyhits
+        results['truncated_files'] = self.truncated_files
         results['license'] = self.get_license()
         results['url'] = self.repo_url
         self.results = results
@@ -76,8 +61,8 @@ class NpmHandler(BaseHandler):
         return self.results
 
     def get_license(self):
-        url = f"https://registry.npmjs.org/{self.get_pkg_name()}"
-        response = requests.get(url)
+        url = self.metadata_url()
+        response = http_client.get_metadata(url)
         if response.status_code == 200:
             data = response.json()
             latest_version = data['dist-tags']['latest']
@@ -87,6 +72,10 @@ class NpmHandler(BaseHandler):
             logging.error("Can't obtain data from NPM")
             return ''
 
+    def metadata_url(self, pkg_name=None):
+        pkg_name = pkg_name or self.get_pkg_name()
+        return f"https://registry.npmjs.org/{pkg_name}"
+
     def construct_download_url(self):
         return (
             f"https://registry.npmjs.org/"
@@ -1,44 +1,31 @@
 import os
 import logging
-import requests
 from .base_handler import BaseHandler
+from .. import http_client
 from ..common import PackageManager, temp_directory
 from ..utils import download_file, temp_directory, extract_zip
 
 
 class NugetHandler(BaseHandler):
-    def fetch(self):
+    def download(self):
         download_url = self.construct_download_url()
         self.repo_url = download_url
-        with temp_directory() as temp_dir:
-            filename = (
-                f"{self.purl_details['name']}-"
-                f"{self.purl_details['version']}.zip"
-            )
-            package_file_path = os.path.join(
-                temp_dir,
-                filename
-            )
-            rst = download_file(download_url, package_file_path)
-            if rst:
-                logging.info(f"Downloaded package to {package_file_path}")
-                self.temp_dir = temp_dir
-                self.unpack()
-                self.scan()
-            else:
-                self.placehldr()
-
-    def placehldr(self):
-        results = {}
-        logging.info("Placeholder results...")
-        results['license_files'] = {}
-        results['copyrights'] = {}
-        results['license'] = 'HTTP-404'
-        results['url'] = self.repo_url
-        self.results = results
+        filename = (
+            f"{self.purl_details['name']}-"
+            f"{self.purl_details['version']}.zip"
+        )
+        package_file_path = os.path.join(
+            self.temp_dir,
+            filename
+        )
+        rst = download_file(download_url, package_file_path)
+        if rst:
+            logging.info(f"Downloaded package to {package_file_path}")
+            self.archive_path = package_file_path
+        return rst
 
     def unpack(self):
-        if self.temp_dir:
+        if self.temp_dir and not self.scan_in_archive():
             filename = (
                 f"{self.purl_details['name']}-"
                 f"{self.purl_details['version']}.zip"
@@ -53,12 +40,10 @@ class NugetHandler(BaseHandler):
     def scan(self):
         results = {}
         logging.info("Scanning package contents...")
-        files = PackageManager.scan_for_files(
-            self.temp_dir, ['COPYRIGHT', 'NOTICES', 'LICENSE', 'COPYING']
-        )
+        files, copyhits = self.scan_package()
         results['license_files'] = files
-        copyhits = PackageManager.scan_for_copyright(self.temp_dir)
         results['copyrights'] = copyhits
+        results['truncated_files'] = self.truncated_files
         pkg_name = self.purl_details['name']
         results['license'] = self.get_license(pkg_name)
         results['url'] = self.repo_url
@@ -77,12 +62,8 @@ class NugetHandler(BaseHandler):
         return self.results
 
     def get_license(self, pkg_name):
-        pkg_name = pkg_name.lower()
-        url = (
-            "https://api.nuget.org/v3/registration5-semver1/"
-            f"{pkg_name}/index.json"
-        )
-        response = requests.get(url)
+        url = self.metadata_url(pkg_name)
+        response = http_client.get_metadata(url)
         if response.status_code == 200:
             data = response.json()
             reg_page_data = data['items'][-1]
@@ -91,7 +72,7 @@ class NugetHandler(BaseHandler):
                 reg_data = reg_page_data
             else:
                 reg_leaf_url = reg_page_data['@id']
-                response = requests.get(reg_leaf_url)
+                response = http_client.get_metadata(reg_leaf_url)
                 if response.status_code == 200:
                     reg_data = response.json()
                 else:
@@ -107,6 +88,13 @@ class NugetHandler(BaseHandler):
             logging.error("Can't obtain data from Nuget Registry")
             return ''
 
+    def metadata_url(self, pkg_name=None):
+        pkg_name = (pkg_name or self.purl_details['name']).lower()
+        return (
+            "https://api.nuget.org/v3/registration5-semver1/"
+            f"{pkg_name}/index.json"
+        )
+
     def construct_download_url(self):
         namespace = (
             self.purl_details['namespace'].replace('%40', '@')
@@ -0,0 +1,506 @@
+import time
+import random
+import threading
+import requests
+from concurrent import futures
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+from . import stats
+from . import deadline
+from .errors import PackageError
+from .cache import get_metadata_cache
+
+# Hosts to keep pools for, and keep-alive connections per host
+POOL_CONNECTIONS = 16
+POOL_MAXSIZE = 16
+# Seconds to wait for a connection, and between bytes of a response
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60
+# Requests per second allowed to a host; hosts not listed are unlimited.
+# crates.io asks crawlers for at most one request per second, and
+# unauthenticated GitHub API clients get 60 requests an hour.
+RATE_LIMITS = {
+    "crates.io": 1.0,
+    "api.github.com": 60 / 3600,
+}
+# Requests a host may get at once before its rate applies; hosts not
+# listed get max(1, rate). GitHub's hourly allowance can be spent at once.
+RATE_BURSTS = {
+    "api.github.com": 60,
+}
+# Retries of a request answered with 429 or 5xx, the first one after
+# about RETRY_BACKOFF seconds and each later one after twice as long.
+# Servers asking for a longer wait than MAX_RETRY_DELAY are not retried.
+MAX_RETRIES = 3
+RETRY_BACKOFF = 1.0
+MAX_RETRY_DELAY = 60
+# Requests in flight to a host start at INITIAL_HOST_CONCURRENCY and
+# adapt between MIN_ and MAX_HOST_CONCURRENCY: they grow while the host
+# answers promptly and halve on throttling, server errors, timeouts or
+# replies taking LATENCY_SPIKE times longer than usual.
+INITIAL_HOST_CONCURRENCY = 4
+MIN_HOST_CONCURRENCY = 1
+MAX_HOST_CONCURRENCY = 32
+LATENCY_SPIKE = 3.0
+
+_session = None
+_session_lock = threading.Lock()
+_buckets = {}
+_buckets_lock = threading.Lock()
+_limits = {}
+# Metadata documents shared by the PURLs of one package: url -> _Shared
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def _build_session(pool_maxsize):
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=pool_maxsize
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session():
+    """Return the process-wide session shared by every handler."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _build_session(POOL_MAXSIZE)
+        return _session
+
+
+def configure(pool_maxsize):
+    """Size the per-host connection pools for the expected concurrency."""
+    global _session, POOL_MAXSIZE
+    with _session_lock:
+        POOL_MAXSIZE = max(pool_maxsize, 1)
+        if _session is not None:
+            _session.close()
+        _session = _build_session(POOL_MAXSIZE)
+
+
+def set_timeouts(connect=None, read=None):
+    """Set the connect and read timeouts, in seconds, of every request."""
+    global CONNECT_TIMEOUT, READ_TIMEOUT
+    if connect is not None:
+        CONNECT_TIMEOUT = connect
+    if read is not None:
+        READ_TIMEOUT = read
+
+
+def set_rate_limit(host, rate, burst=None):
+    """Allow rate requests per second to host; None removes the limit.
+
+    Up to burst requests may go at once, by default max(1, rate).
+    """
+    with _buckets_lock:
+        RATE_LIMITS[host] = rate
+        RATE_BURSTS[host] = burst
+        _buckets.pop(host, None)
+
+
+def set_retries(retries, backoff=None):
+    """Set the retries of 429 and 5xx replies and the first backoff."""
+    global MAX_RETRIES, RETRY_BACKOFF
+    MAX_RETRIES = max(retries, 0)
+    if backoff is not None:
+        RETRY_BACKOFF = backoff
+
+
+class TokenBucket:
+    """Spread requests to a host at rate per second, in bursts up to burst.
+
+    Without a rate the bucket never throttles, but pause() still holds
+    requests back, e.g. until a server's rate limit window resets.
+    """
+
+    def __init__(self, rate=None, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate or 0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return the seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            wait = self.paused_until - now
+            if self.rate:
+                elapsed = now - self.updated
+                self.tokens = min(
+                    self.burst, self.tokens + elapsed * self.rate
+                )
+                self.updated = now
+                # Tokens can go negative: waiters queue up behind each other
+                self.tokens -= 1
+                if self.tokens < 0:
+                    wait = max(wait, -self.tokens / self.rate)
+            return max(wait, 0.0)
+
+    def acquire(self, host=None):
+        """Wait for a token; fail at once if the host paused for too long."""
+        wait = self.reserve()
+        if wait > MAX_RETRY_DELAY:
+            # Give the token back so requests failing here do not push
+            # everyone else's wait further out
+            with self._lock:
+                if self.rate:
+                    self.tokens += 1
+            raise PackageError(
+                f"{host} is rate limited for {wait:.0f}s", transient=True
+            )
+        if wait > 0:
+            stats.incr("http_throttled")
+            _sleep(wait)
+
+    def pause(self, seconds):
+        with self._lock:
+            self.paused_until = max(
+                self.paused_until, time.monotonic() + seconds
+            )
+
+
+class ConcurrencyLimit:
+    """Adaptive cap on the requests in flight to one host (AIMD).
+
+    Each prompt reply raises the limit by 1/limit, about one per round
+    of requests; a failed or unusually slow one halves it, at most once
+    per typical reply time so a burst of failures counts once.
+    """
+
+    def __init__(self, host, limit=None):
+        self.host = host
+        self.limit = float(limit or INITIAL_HOST_CONCURRENCY)
+        self.in_flight = 0
+        # Smoothed seconds until a reply's headers arrive
+        self.latency = None
+        self.decreased_at = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            if self.in_flight >= int(self.limit):
+                stats.incr("http_concurrency_waits")
+            while self.in_flight >= int(self.limit):
+                self._cond.wait(deadline.timeout(None))
+            self.in_flight += 1
+
+    def release(self, latency=None, failed=False):
+        """Free a slot, adapting the limit to how the request went.
+
+        Without a latency or failure, e.g. when the request never got
+        sent, the limit is left alone.
+        """
+        with self._cond:
+            self.in_flight -= 1
+            slow = (
+                latency is not None and self.latency is not None
+                and latency > LATENCY_SPIKE * self.latency
+            )
+            now = time.monotonic()
+            if failed or slow:
+                if now - self.decreased_at > (self.latency or 0):
+                    self.limit = max(MIN_HOST_CONCURRENCY, self.limit / 2)
+                    self.decreased_at = now
+            elif latency is not None:
+                self.limit = min(
+                    MAX_HOST_CONCURRENCY, self.limit + 1 / self.limit
+                )
+            if latency is not None and not failed:
+                self.latency = latency if self.latency is None else (
+                    0.8 * self.latency + 0.2 * latency
+                )
+            stats.gauge(
+                f"host_concurrency[{self.host}]", round(self.limit, 2)
+            )
+            self._cond.notify_all()
+
+
+def get_limit(host):
+    with _buckets_lock:
+        if host not in _limits:
+            _limits[host] = ConcurrencyLimit(host)
+        return _limits[host]
+
+
+def _release_on_close(response, limit, latency):
+    # A streamed body is still being transferred: keep the host slot
+    # until the caller closes the response
+    close = response.close
+    released = []
+
+    def release_and_close():
+        try:
+            close()
+        finally:
+            if not released:
+                released.append(True)
+                limit.release(latency)
+
+    response.close = release_and_close
+    return response
+
+
+def get_bucket(host):
+    with _buckets_lock:
+        if host not in _buckets:
+            _buckets[host] = TokenBucket(
+                RATE_LIMITS.get(host), RATE_BURSTS.get(host)
+            )
+        return _buckets[host]
+
+
+def _sleep(seconds):
+    # Never sleep past the deadline of the PURL being processed
+    time.sleep(deadline.timeout(seconds))
+    deadline.check()
+
+
+def _rate_limited(response):
+    # GitHub answers 403, not 429, once a rate limit is used up
+    return response.status_code == 403 and (
+        response.headers.get("X-RateLimit-Remaining") == "0"
+        or "Retry-After" in response.headers
+    )
+
+
+def should_retry(response):
+    """Whether response is a throttling or server error worth retrying."""
+    return (
+        response.status_code == 429 or response.status_code >= 500
+        or _rate_limited(response)
+    )
+
+
+def retry_after(response):
+    """Seconds the server asks us to wait before the next request, or None.
+
+    Reads Retry-After, as seconds or an HTTP date, and otherwise GitHub's
+    X-RateLimit-Reset once X-RateLimit-Remaining is down to 0.
+    """
+    value = response.headers.get("Retry-After")
+    if value:
+        if value.strip().isdigit():
+            return float(value)
+        try:
+            return parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            pass
+    reset = response.headers.get("X-RateLimit-Reset")
+    if response.headers.get("X-RateLimit-Remaining") == "0" and reset:
+        try:
+            return float(reset) - time.time()
+        except ValueError:
+            pass
+    return None
+
+
+def _timeout():
+    # Never wait past the deadline of the PURL being processed
+    return (
+        deadline.timeout(CONNECT_TIMEOUT), deadline.timeout(READ_TIMEOUT)
+    )
+
+
+def _send(method, url, timeout, **kwargs):
+    try:
+        return get_session().request(
+            method, url, timeout=timeout or _timeout(), **kwargs
+        )
+    except requests.Timeout:
+        deadline.check()
+        raise
+
+
+def _limited_send(limit, bucket, host, method, url, timeout, **kwargs):
+    limit.acquire()
+    try:
+        bucket.acquire(host)
+        started = time.monotonic()
+        response = _send(method, url, timeout, **kwargs)
+    except (requests.ConnectionError, requests.Timeout):
+        limit.release(failed=True)
+        raise
+    except BaseException:
+        limit.release()
+        raise
+    latency = time.monotonic() - started
+    if should_retry(response):
+        limit.release(latency, failed=True)
+    elif kwargs.get("stream"):
+        return _release_on_close(response, limit, latency)
+    else:
+        limit.release(latency)
+    return response
+
+
+def request(method, url, timeout=None, **kwargs):
+    """Send a request through the shared session and the host rate limit.
+
+    Requests wait for a slot under the host's adaptive concurrency limit
+    (see ConcurrencyLimit) and a token from its rate limit bucket.
+    Uses the default timeouts unless given one. Replies with 429, 5xx or
+    GitHub's rate limit 403 are retried up to MAX_RETRIES times, after
+    the delay the server asks for or an exponential backoff with jitter;
+    the last reply is returned when retries run out. A wait cut short by
+    the PURL deadline raises DeadlineExceeded.
+    """
+    host = urlparse(url).hostname
+    bucket = get_bucket(host)
+    limit = get_limit(host)
+    attempt = 0
+    while True:
+        response = _limited_send(
+            limit, bucket, host, method, url, timeout, **kwargs
+        )
+        delay = retry_after(response)
+        if delay is not None and delay > 0:
+            # Hold back every request to this host, not just this one
+            bucket.pause(delay)
+        if not should_retry(response) or attempt >= MAX_RETRIES:
+            return response
+        if delay is None:
+            # Full jitter keeps concurrent workers from retrying in step
+            delay = random.uniform(0, RETRY_BACKOFF * 2 ** attempt)
+        elif delay > MAX_RETRY_DELAY:
+            return response
+        attempt += 1
+        stats.incr("http_retries")
+        response.close()
+        _sleep(max(delay, 0))
+
+
+def get(url, **kwargs):
+    kwargs.setdefault("allow_redirects", True)
+    return request("GET", url, **kwargs)
+
+
+def head(url, **kwargs):
+    kwargs.setdefault("allow_redirects", False)
+    return request("HEAD", url, **kwargs)
+
+
+def _cached_response(url, entry):
+    response = Response()
+    response.status_code = 200
+    response.url = url
+    response._content = entry["body"]
+    if entry.get("content_type"):
+        response.headers["Content-Type"] = entry["content_type"]
+    return response
+
+
+class _Shared:
+    def __init__(self):
+        self.refs = 0
+        # Holds (status, body, headers) once the first caller fetched it
+        self.future = None
+
+
+def share_metadata(url, refs=1):
+    """Keep the metadata document at url in memory for refs more PURLs.
+
+    Until each of them calls release_metadata, get_metadata fetches the
+    document once, even when they ask for it concurrently, and hands
+    every caller a copy.
+    """
+    with _shared_lock:
+        _shared.setdefault(url, _Shared()).refs += refs
+
+
+def release_metadata(url):
+    with _shared_lock:
+        shared = _shared.get(url)
+        if shared is not None:
+            shared.refs -= 1
+            if shared.refs <= 0:
+                del _shared[url]
+
+
+def _shared_response(url, document):
+    status, body, headers = document
+    response = Response()
+    response.status_code = status
+    response.url = url
+    response._content = body
+    response.headers.update(headers)
+    return response
+
+
+def _check_throttled(url, response):
+    # Out of retries: a guess from an error page would be a wrong answer
+    if should_retry(response):
+        raise PackageError(
+            f"{url} answered HTTP {response.status_code}", transient=True
+        )
+    return response
+
+
+def get_metadata(url, **kwargs):
+    """GET a registry metadata document through the disk cache.
+
+    Fresh entries are served without touching the network; stale ones are
+    revalidated with If-None-Match/If-Modified-Since and refreshed on 304.
+    Only successful responses are cached. Documents registered with
+    share_metadata are fetched once and served from memory. Raises a
+    transient PackageError when the registry is still throttling or
+    failing after retries.
+    """
+    with _shared_lock:
+        shared = _shared.get(url)
+        owner = shared is not None and shared.future is None
+        if owner:
+            shared.future = futures.Future()
+        future = shared.future if shared is not None else None
+    if future is None:
+        return _get_metadata(url, **kwargs)
+    if not owner:
+        stats.incr("metadata_shared")
+        try:
+            return _shared_response(
+                url, future.result(deadline.timeout(None))
+            )
+        except futures.TimeoutError:
+            deadline.check()
+            raise
+    try:
+        response = _get_metadata(url, **kwargs)
+    except BaseException as e:
+        # Let later callers try again rather than share the failure
+        with _shared_lock:
+            shared.future = None
+        future.set_exception(e)
+        raise
+    future.set_result(
+        (response.status_code, response.content, dict(response.headers))
+    )
+    return response
+
+
+def _get_metadata(url, **kwargs):
+    cache = get_metadata_cache()
+    if cache is None:
+        stats.incr("metadata_fetches")
+        return _check_throttled(url, get(url, **kwargs))
+    entry = cache.get(url)
+    if entry is not None and cache.is_fresh(entry):
+        return _cached_response(url, entry)
+    headers = dict(kwargs.pop("headers", None) or {})
+    if entry is not None:
+        headers.update(cache.validators(entry))
+    stats.incr("metadata_fetches")
+    response = _check_throttled(url, get(url, headers=headers, **kwargs))
+    if response.status_code == 304 and entry is not None:
+        cache.touch(entry)
+        return _cached_response(url, entry)
+    if response.status_code == 200:
+        cache.put(url, response)
+    return response
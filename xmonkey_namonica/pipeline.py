@@ -0,0 +1,217 @@
+import os
+import queue
+import logging
+import time
+import tempfile
+import threading
+from . import deadline
+from .errors import error_result
+
+# PURLs fed per stage worker ahead of the next result to yield, so a slow
+# PURL holding up in-order output does not let finished results pile up
+WINDOW_PER_WORKER = 4
+
+
+class _Job:
+    def __init__(self, index, purl):
+        self.index = index
+        self.purl = purl
+        self.handler = None
+        self.started = None
+        self.deadline = None
+        self.result = None
+        self.error = None
+        self.done = False
+
+
+class Pipeline:
+    """Run handlers through separate download, unpack and scan stages.
+
+    Each stage has its own pool of worker threads and stages are connected
+    by bounded queues, so network-bound downloads of later packages overlap
+    with the extraction and scanning of earlier ones. A PURL that takes
+    more than timeout seconds from the start of its download, including
+    time spent queued between stages, yields a timeout report. At most
+    window PURLs are in flight or waiting to be yielded at once.
+    """
+
+    def __init__(
+        self,
+        handler_factory,
+        download_workers=4,
+        unpack_workers=2,
+        scan_workers=None,
+        queue_size=8,
+        timeout=None,
+        window=None
+    ):
+        self.handler_factory = handler_factory
+        self.stages = [
+            (self._download, download_workers),
+            (self._unpack, unpack_workers),
+            (self._scan, scan_workers or os.cpu_count() or 1),
+        ]
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.window = window or WINDOW_PER_WORKER * sum(
+            workers for _, workers in self.stages
+        )
+
+    def _download(self, job):
+        job.handler = self.handler_factory(job.purl)
+        job.handler.temp_dir = tempfile.mkdtemp()
+        if not job.handler.download():
+            job.handler.placehldr()
+            self._finish(job)
+
+    def _unpack(self, job):
+        job.handler.unpack()
+
+    def _scan(self, job):
+        job.handler.scan()
+        self._finish(job)
+
+    def _finish(self, job):
+        job.result = job.handler.generate_report()
+        job.handler.cleanup()
+        job.done = True
+
+    def _put(self, out_queue, item, stop):
+        while not stop.is_set():
+            try:
+                out_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _worker(self, stage, in_queue, out_queue, stop):
+        while not stop.is_set():
+            try:
+                job = in_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if job is None:
+                return
+            if job.started is None:
+                job.started = time.monotonic()
+                job.deadline = deadline.start(self.timeout)
+            if not job.done and job.error is None:
+                try:
+                    with deadline.budget(job.deadline):
+                        deadline.check()
+                        stage(job)
+                except Exception as e:
+                    logging.error(f"Failed to process {job.purl}: {e}")
+                    job.error = e
+                    if job.handler is not None:
+                        job.handler.cleanup()
+            if not self._put(out_queue, job, stop):
+                self._discard_job(job)
+
+    def _run_stage(
+        self, stage, workers, next_workers, in_queue, out_queue, stop
+    ):
+        threads = [
+            threading.Thread(
+                target=self._worker,
+                args=(stage, in_queue, out_queue, stop),
+                daemon=True
+            )
+            for _ in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Only pass shutdown markers on once the whole stage is drained
+        for _ in range(next_workers):
+            self._put(out_queue, None, stop)
+
+    def _feed(self, purls, out_queue, workers, slots, stop):
+        for index, purl in enumerate(purls):
+            # Wait for a result to be yielded once the window is full
+            while not slots.acquire(timeout=0.1):
+                if stop.is_set():
+                    return
+            self._put(out_queue, _Job(index, purl), stop)
+        for _ in range(workers):
+            self._put(out_queue, None, stop)
+
+    def run(self, purls, progress=None, started=None):
+        """Yield a report per PURL in input order.
+
+        A PURL that fails in any stage yields an error report instead of
+        stopping the run. When given, started maps each PURL to a deque
+        that gets the time.monotonic() its processing started.
+        """
+        stop = threading.Event()
+        slots = threading.Semaphore(self.window)
+        queues = [
+            queue.Queue(maxsize=self.queue_size)
+            for _ in range(len(self.stages) + 1)
+        ]
+        threads = [
+            threading.Thread(
+                target=self._feed,
+                args=(purls, queues[0], self.stages[0][1], slots, stop),
+                daemon=True
+            )
+        ]
+        for position, (stage, workers) in enumerate(self.stages):
+            next_workers = (
+                self.stages[position + 1][1]
+                if position + 1 < len(self.stages) else 1
+            )
+            threads.append(threading.Thread(
+                target=self._run_stage,
+                args=(
+                    stage, workers, next_workers,
+                    queues[position], queues[position + 1], stop
+                ),
+                daemon=True
+            ))
+        for thread in threads:
+            thread.start()
+        pending = {}
+        next_index = 0
+        try:
+            while next_index < len(purls):
+                job = queues[-1].get()
+                if job is None:
+                    break
+                if progress is not None:
+                    progress.update(1)
+                if started is not None and job.started is not None:
+                    started[job.purl].append(job.started)
+                pending[job.index] = job
+                while next_index in pending:
+                    job = pending.pop(next_index)
+                    next_index += 1
+                    slots.release()
+                    if job.error is not None:
+                        yield error_result(job.purl, job.error)
+                    else:
+                        yield job.result
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            for job_queue in queues:
+                self._discard(job_queue)
+            for job in pending.values():
+                self._discard_job(job)
+
+    def _discard(self, job_queue):
+        while True:
+            try:
+                job = job_queue.get_nowait()
+            except queue.Empty:
+                return
+            if job is not None:
+                self._discard_job(job)
+
+    def _discard_job(self, job):
+        if job.handler is not None:
+            job.handler.cleanup()
+
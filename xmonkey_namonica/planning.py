@@ -0,0 +1,49 @@
+import logging
+from collections import defaultdict
+from . import http_client
+from .common import PackageManager
+from .handlers import load_handler
+
+
+class MetadataPlan:
+    """Group PURLs by package so its versions share one metadata fetch.
+
+    Each PURL's handler names the registry document describing its whole
+    package (see BaseHandler.metadata_url). The plan shares that document
+    through http_client once per PURL using it, so it is fetched once and
+    kept in memory until done() has been called for each of those PURLs.
+    The parsed PURLs are kept in details for creating their handlers.
+    """
+
+    def __init__(self, purls):
+        # PURL -> one metadata URL per occurrence in purls
+        self.urls = defaultdict(list)
+        # PURL -> its PackageManager.parse_purl() details
+        self.details = {}
+        packages = defaultdict(int)
+        for purl in purls:
+            try:
+                if purl not in self.details:
+                    self.details[purl] = PackageManager.parse_purl(purl)
+                purl_details = self.details[purl]
+                handler_class = load_handler(purl_details['type'])
+                url = handler_class(purl, purl_details).metadata_url()
+            except Exception as e:
+                # Bad PURLs are reported when they are processed
+                logging.debug(f"Not planning {purl}: {e}")
+                continue
+            if url:
+                packages[url] += 1
+                self.urls[purl].append(url)
+        for url, refs in packages.items():
+            http_client.share_metadata(url, refs)
+        logging.info(
+            f"Planned {sum(packages.values())} PURLs over "
+            f"{len(packages)} package metadata documents"
+        )
+
+    def done(self, purl):
+        """Release the metadata kept for one occurrence of purl."""
+        urls = self.urls.get(purl)
+        if urls:
+            http_client.release_metadata(urls.pop())
@@ -0,0 +1,75 @@
+import math
+import threading
+from collections import Counter, defaultdict
+
+# Counters describing the current run, printed by the CLI with --stats
+_counters = Counter()
+# Timings, e.g. per-PURL latency, reported as percentiles
+_samples = defaultdict(list)
+# Current values, e.g. the concurrency limit of each host
+_gauges = {}
+_lock = threading.Lock()
+
+
+def incr(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+
+def gauge(name, value):
+    """Set the current value of name."""
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name, value):
+    """Record one sample, e.g. a duration in seconds, of name."""
+    with _lock:
+        _samples[name].append(value)
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a sorted, non-empty list of values."""
+    rank = max(1, math.ceil(percent / 100 * len(values)))
+    return values[rank - 1]
+
+
+def merge(counts):
+    """Add counts collected elsewhere, e.g. in a scan worker process."""
+    with _lock:
+        _counters.update(counts)
+
+
+def snapshot():
+    with _lock:
+        return dict(_counters)
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _samples.clear()
+        _gauges.clear()
+
+
+def report():
+    """Format the counters and gauges as sorted "name: value" lines.
+
+    Samples follow as "name: count=N p50=... p95=... p99=... max=...".
+    """
+    with _lock:
+        current = dict(_counters)
+        current.update(_gauges)
+        samples = {name: sorted(values) for name, values in _samples.items()}
+    lines = [f"{name}: {value}" for name, value in sorted(current.items())]
+    for name, values in sorted(samples.items()):
+        if not values:
+            continue
+        quantiles = " ".join(
+            f"p{percent}={percentile(values, percent):.3f}"
+            for percent in (50, 95, 99)
+        )
+        lines.append(
+            f"{name}: count={len(values)} {quantiles} max={values[-1]:.3f}"
+        )
+    return "\n".join(lines)
@@ -1,41 +1,184 @@
 import os
+import re
 import bz2
-import magic
+import mmap
+import codecs
 import shutil
+import hashlib
 import requests
 import logging
 import zipfile
 import tarfile
 import tempfile
+import threading
+import subprocess
 from contextlib import contextmanager
+from . import http_client
+from . import deadline
+from .cache import get_artifact_cache
+from .errors import PackageError, is_transient
 
 
+LICENSE_PATTERNS = ['COPYRIGHT', 'NOTICES', 'LICENSE', 'COPYING']
+
 logging.basicConfig(
     level=logging.ERROR,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
 
-def download_file(url, dest):
+# Upper bound in bytes for a single download, None for no limit
+MAX_DOWNLOAD_SIZE = None
+
+
+def set_max_download_size(max_bytes):
+    global MAX_DOWNLOAD_SIZE
+    MAX_DOWNLOAD_SIZE = max_bytes
+
+
+def stream_to_file(response, dest, max_size=None):
+    """Write a streamed response body to dest and return its sha256.
+
+    Raises ValueError as soon as the body is known to exceed max_size
+    bytes (MAX_DOWNLOAD_SIZE by default), removing the partial file.
+    """
+    max_size = max_size or MAX_DOWNLOAD_SIZE
+    length = response.headers.get('Content-Length', '')
+    if max_size and length.isdigit() and int(length) > max_size:
+        raise ValueError(
+            f"Download of {length} bytes exceeds limit of {max_size}"
+        )
+    hash_sha256 = hashlib.sha256()
+    size = 0
+    try:
+        with open(dest, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=65536):
+                deadline.check()
+                size += len(chunk)
+                if max_size and size > max_size:
+                    raise ValueError(
+                        f"Download exceeds limit of {max_size} bytes"
+                    )
+                f.write(chunk)
+                hash_sha256.update(chunk)
+    except BaseException:
+        if os.path.exists(dest):
+            os.remove(dest)
+        raise
+    return hash_sha256
+
+
+def download_file(url, dest, sha256=None):
     logging.info(f"download_file {url} to {dest}")
+    artifacts = get_artifact_cache()
+    if artifacts is not None and artifacts.fetch(url, dest, sha256):
+        return True
     try:
-        with requests.get(url, stream=True) as response:
+        with http_client.get(url, stream=True) as response:
             response.raise_for_status()
-            with open(dest, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+            hash_sha256 = stream_to_file(response, dest)
         logging.info(f"Downloaded file from {url} to {dest}")
+        if artifacts is not None:
+            artifacts.store(url, dest, hash_sha256.hexdigest())
         return True
     except requests.RequestException as e:
         logging.error(f"Failed to download file from {url}: {e}")
+        if is_transient(e):
+            raise PackageError(
+                f"Failed to download {url}: {e}", transient=True
+            ) from e
         return False
 
 
+# Seconds a git clone or checkout may take
+GIT_TIMEOUT = 600
+
+
+def run_git(*args, cwd=None):
+    """Run a git command quietly, raising CalledProcessError on failure.
+
+    Gives up after GIT_TIMEOUT seconds or at the deadline of the PURL,
+    raising DeadlineExceeded when the deadline is what ran out and a
+    transient PackageError otherwise.
+    """
+    timeout = deadline.timeout(GIT_TIMEOUT)
+    try:
+        subprocess.run(
+            ["git", *args],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            cwd=cwd,
+            timeout=timeout
+        )
+    except subprocess.TimeoutExpired as e:
+        deadline.check()
+        raise PackageError(
+            f"git {args[0]} timed out after {timeout:.1f}s", transient=True
+        ) from e
+
+
+class ExtractPolicy:
+    """Decide which archive members are worth materializing.
+
+    License files are always kept, as are nested archives that later
+    extraction steps unpack. Other members are kept when they look like
+    text (judged by extension) and are no larger than max_size bytes.
+    """
+
+    archive_extensions = (
+        '.tar', '.gz', '.tgz', '.bz2', '.xz', '.zip', '.gem',
+    )
+    binary_extensions = (
+        '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.ico', '.icns', '.webp',
+        '.tif', '.tiff', '.psd', '.mp3', '.mp4', '.wav', '.ogg', '.avi',
+        '.mov', '.pdf', '.ttf', '.otf', '.woff', '.woff2', '.eot', '.so',
+        '.dll', '.dylib', '.exe', '.a', '.o', '.obj', '.lib', '.class',
+        '.pyc', '.pyo', '.pyd', '.wasm', '.node', '.bin', '.dat', '.db',
+        '.sqlite', '.jar', '.war', '.nupkg', '.whl', '.egg', '.rlib',
+        '.pdb', '.snk', '.p12', '.keystore',
+    )
+
+    def __init__(self, patterns=LICENSE_PATTERNS, max_size=1024 * 1024):
+        self.patterns = [re.compile(p, re.IGNORECASE) for p in patterns]
+        self.max_size = max_size
+
+    def is_license_file(self, name):
+        basename = name.rsplit('/', 1)[-1]
+        return any(pattern.search(basename) for pattern in self.patterns)
+
+    def wants(self, name, size):
+        if self.is_license_file(name):
+            return True
+        lower_name = name.lower()
+        if lower_name.endswith(self.archive_extensions):
+            return True
+        if lower_name.endswith(self.binary_extensions):
+            return False
+        return size <= self.max_size
+
+
+# Policy applied by extract_tar/extract_zip, None extracts everything
+EXTRACT_POLICY = None
+
+
+def set_extract_policy(policy):
+    global EXTRACT_POLICY
+    EXTRACT_POLICY = policy
+
+
 def extract_zip(file_path, extract_to):
     logging.info(f"extract_zip {file_path} to {extract_to}")
     try:
         with zipfile.ZipFile(file_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_to)
+            members = None
+            if EXTRACT_POLICY is not None:
+                members = [
+                    info for info in zip_ref.infolist()
+                    if info.is_dir() or
+                    EXTRACT_POLICY.wants(info.filename, info.file_size)
+                ]
+            zip_ref.extractall(extract_to, members=members)
         remove(file_path)
         logging.info(f"Extracted ZIP file {file_path} to {extract_to}")
     except zipfile.BadZipFile as e:
@@ -47,7 +190,17 @@ def extract_tar(file_path, extract_to):
     logging.info(f"extract_tar {file_path} to {extract_to}")
     try:
         with tarfile.open(file_path, 'r:*') as tar_ref:
-            tar_ref.extractall(extract_to)
+            members = None
+            if EXTRACT_POLICY is not None:
+                # Links are dropped as their targets may be skipped
+                members = [
+                    info for info in tar_ref
+                    if info.isdir() or (
+                        info.isfile() and
+                        EXTRACT_POLICY.wants(info.name, info.size)
+                    )
+                ]
+            tar_ref.extractall(extract_to, members=members)
         remove(file_path)
         logging.info(f"Extracted TAR file {file_path} to {extract_to}")
     except tarfile.TarError as e:
@@ -55,6 +208,153 @@ def extract_tar(file_path, extract_to):
         raise
 
 
+def iter_archive(file_path):
+    """Yield (name, size, file object) for each regular file in an archive.
+
+    Tarballs are read as a stream and zip files through their central
+    directory, so nothing is written to disk. Each file object is only
+    valid until the next member is requested.
+    """
+    if zipfile.is_zipfile(file_path):
+        with zipfile.ZipFile(file_path, 'r') as zip_ref:
+            for info in zip_ref.infolist():
+                if info.is_dir():
+                    continue
+                with zip_ref.open(info) as member:
+                    yield info.filename, info.file_size, member
+    else:
+        with tarfile.open(file_path, 'r|*') as tar_ref:
+            for info in tar_ref:
+                if not info.isfile():
+                    continue
+                member = tar_ref.extractfile(info)
+                yield info.name, info.size, member
+
+
+@contextmanager
+def mapped_file(file_path):
+    """Yield a read-only memory map of file_path (b'' when it is empty)."""
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # Empty files cannot be mapped
+            yield b''
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+
+def decode_text(data, encodings=('utf-8', 'iso-8859-1')):
+    for encoding in encodings:
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+_mime_local = threading.local()
+
+# Leading bytes of formats that are never scanned as text. Prefixes that
+# could also start a text file are checked further in sniff_mime.
+MIME_SIGNATURES = (
+    (b'\x1f\x8b', 'application/gzip'),
+    (b'PK\x03\x04', 'application/zip'),
+    (b'PK\x05\x06', 'application/zip'),
+    (b'\xfd7zXZ\x00', 'application/x-xz'),
+    (b'7z\xbc\xaf\x27\x1c', 'application/x-7z-compressed'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'%PDF-', 'application/pdf'),
+    (b'%!PS', 'application/postscript'),
+    (b'\x7fELF', 'application/x-executable'),
+    (b'\xca\xfe\xba\xbe', 'application/x-java-applet'),
+    (b'\xcf\xfa\xed\xfe', 'application/x-mach-binary'),
+    (b'\xce\xfa\xed\xfe', 'application/x-mach-binary'),
+    (b'\x00asm', 'application/wasm'),
+    (b'wOFF', 'font/woff'),
+    (b'wOF2', 'font/woff2'),
+)
+# Bytes read from the start of a file to classify it
+MIME_HEADER_SIZE = 2048
+# Control characters other than these mark content as binary
+_TEXT_CONTROLS = frozenset(b'\t\n\r\f\b\x1b')
+_BINARY_BYTES = bytes(
+    b for b in range(32) if b not in _TEXT_CONTROLS
+) + b'\x7f'
+# C1 controls, which rule out Latin-1 text
+_C1_BYTES = bytes(range(0x80, 0xa0))
+
+
+def get_mime_detector():
+    """Return this thread's libmagic detector, created on first use.
+
+    Building a magic.Magic loads the whole magic database, so each
+    thread keeps one instead of creating it per file; libmagic handles
+    are not safe to share between threads.
+    """
+    detector = getattr(_mime_local, 'detector', None)
+    if detector is None:
+        # Only needed when sniffing is inconclusive, so load it lazily
+        import magic
+        detector = magic.Magic(mime=True)
+        _mime_local.detector = detector
+    return detector
+
+
+def sniff_mime(header):
+    """Classify common formats from their first bytes without libmagic.
+
+    Returns a MIME type for known archive and binary signatures, for
+    empty content and for plain UTF-8 or Latin-1 text, or None when the
+    header is inconclusive.
+    """
+    if not header:
+        return 'application/x-empty'
+    for signature, mimetype in MIME_SIGNATURES:
+        if header.startswith(signature):
+            return mimetype
+    if len(header) > 262 and header[257:262] == b'ustar':
+        return 'application/x-tar'
+    if header.startswith(b'BZh') and header[3:4].isdigit():
+        return 'application/x-bzip2'
+    if len(header.translate(None, _BINARY_BYTES)) != len(header):
+        return None
+    if header.startswith(b'\xef\xbb\xbf'):
+        header = header[3:]
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        # Not final, so a character cut off by the header size is fine
+        decoder.decode(header, final=False)
+        return 'text/plain'
+    except UnicodeDecodeError:
+        pass
+    if len(header.translate(None, _C1_BYTES)) == len(header):
+        return 'text/plain'
+    return None
+
+
+def detect_mime(file_path):
+    """MIME type of file_path, sniffed from its header when possible."""
+    try:
+        with open(file_path, 'rb') as f:
+            mimetype = sniff_mime(f.read(MIME_HEADER_SIZE))
+    except OSError:
+        mimetype = None
+    if mimetype is None:
+        mimetype = get_mime_detector().from_file(file_path)
+    return mimetype
+
+
+def detect_mime_buffer(data):
+    """MIME type of in-memory content, sniffed when possible."""
+    mimetype = sniff_mime(data[:MIME_HEADER_SIZE])
+    if mimetype is None:
+        mimetype = get_mime_detector().from_buffer(data)
+    return mimetype
+
+
 def extract_bz2(file_path, extract_to):
     logging.info(f"extract_bz2 {file_path} to {extract_to}")
     try:
@@ -64,6 +364,9 @@ def extract_bz2(file_path, extract_to):
             extract_to,
             os.path.basename(file_path).replace('.bz2', '')
         )
+        if os.path.abspath(output_file_path) == os.path.abspath(file_path):
+            # No .bz2 suffix to drop, e.g. a generic "downloaded_file"
+            output_file_path += '.out'
         with bz2.BZ2File(file_path, 'rb') as file:
             decompressed_data = file.read()
             with open(output_file_path, 'wb') as f_out:
@@ -77,14 +380,13 @@ def extract_bz2(file_path, extract_to):
 
 def recursive_extract(file_path, extract_to):
     logging.info(f"Recursive Extract {file_path} to {extract_to}")
-    mime = magic.Magic(mime=True)
-    mimetype = mime.from_file(file_path)
+    mimetype = detect_mime(file_path)
     if 'gzip' in mimetype or 'tar' in mimetype:
         extract_tar(file_path, extract_to)
-    elif 'zip' in mimetype:
-        extract_zip(file_path, extract_to)
     elif 'bzip2' in mimetype:
         extract_bz2(file_path, extract_to)
+    elif 'zip' in mimetype:
+        extract_zip(file_path, extract_to)
     else:
         raise ValueError(f"Unsupported archive format: {mimetype}")
 
@@ -95,8 +397,7 @@ def check_and_extract(path, extract_to):
         for root, dirs, files in os.walk(path):
             for file in files:
                 file_path = os.path.join(root, file)
-                mime = magic.Magic(mime=True)
-                mimetype = mime.from_file(file_path)
+                mimetype = detect_mime(file_path)
                 if 'gzip' in mimetype:
                     extract_tar(file_path, extract_to)
                     logging.info(f"Unpacked package in {extract_to}")